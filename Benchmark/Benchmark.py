@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import gettext
+import json
+import os.path
+import random
+import tempfile
+import time
+import typing
+
+from CentralAPI.CentralCoalescer import CoalescingCentral
+from CentralAPI.CentralStack import CentralStack
+from Communication.CommunicationHandler import CommunicationHandler
+from Decomission.CentralDecomission import CentralDecomission
+from Decomission.DecomissionHandler import DecomissionHandler
+from Firmware.CentralFirmwareUpgrade import CentralFirmwareUpgrade
+from Firmware.FirmwareUpgradeHandler import FirmwareUpgradeHandler
+
+from Benchmark.MockCentral import (MockCentral, add_mock_arguments,
+                                   mock_from_arguments)
+
+
+class NullCommunicationHandler(CommunicationHandler):
+    """
+    Discards all output, so only the tool itself is measured
+    """
+
+    async def print_clear(self):
+        pass
+
+    async def print_status(self, message, color):
+        self.last_status = message
+
+    async def print_log(self, message=None):
+        pass
+
+    async def print_serial(self, serial: str):
+        pass
+
+    async def print_excel(self, prefix, filename):
+        pass
+
+
+def percentile(values: typing.List[float], p: float) -> float:
+    """
+    Nearest rank percentile of `values`
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(name: str, latencies: typing.List[float], errors: int,
+              duration: float) -> typing.Dict:
+    return {
+        'name': name,
+        'scans': len(latencies),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'scans_per_s': round(len(latencies) / duration, 1) if duration else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+async def timed(coroutine: typing.Awaitable) -> float:
+    start = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - start
+
+
+async def run_stations(
+    stations: int, scans: typing.List,
+    scan: typing.Callable[[int, typing.Any], typing.Awaitable]
+) -> typing.Tuple[typing.List[float], int, float]:
+    """
+    Spread `scans` over `stations` concurrent workers. Each station scans
+    its share one after another like an operator with a scanner would.
+
+    Returns the latency of every scan, the number of failed scans and the
+    total duration.
+    """
+    latencies = []
+    errors = 0
+
+    async def station(index: int):
+        nonlocal errors
+        for item in scans[index::stations]:
+            start = time.perf_counter()
+            try:
+                await scan(index, item)
+            except Exception as e:
+                errors += 1
+                print(f'Scan of {item} failed: {e!r}')
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[station(index) for index in range(stations)])
+    return latencies, errors, time.perf_counter() - start
+
+
+async def bench_refresh(
+        cfu: CentralFirmwareUpgrade,
+        cen_dec: CentralDecomission,
+        coalescing: typing.Union[CoalescingCentral, None] = None
+) -> typing.List[typing.Dict]:
+    """
+    Full loads of both caches. Warm runs reuse the connections and the
+    token, but not results of the coalescer, so they still load everything
+    from central.
+    """
+    results = []
+    for name, refresh in (('firmware refresh (cold)', cfu.refresh_all),
+                          ('firmware refresh (warm)', cfu.refresh_all),
+                          ('inventory refresh (cold)',
+                           lambda: cen_dec.refresh_devices(comm_handler=None)),
+                          ('inventory refresh (warm)',
+                           lambda: cen_dec.refresh_devices(comm_handler=None))):
+        if coalescing:
+            coalescing.results.clear()
+        results.append({'name': name, 'duration_s': round(
+            await timed(refresh()), 3)})
+    return results
+
+
+async def bench_firmware(cfu: CentralFirmwareUpgrade, mock: MockCentral,
+                         stations: int, scans: int, rescan_ratio: float,
+                         unknown_ratio: float,
+                         rng: random.Random) -> typing.Dict:
+    """
+    Firmware flow. A share of the scans repeats the previous serial
+    (escalation) or uses a serial central doesn't know (lookup).
+    """
+    serials = [*mock.gateways, *mock.switches, *mock.aps]
+    handlers = [
+        FirmwareUpgradeHandler(cfu, comm_handler=NullCommunicationHandler())
+        for _ in range(stations)
+    ]
+
+    items = []
+    for i in range(scans):
+        if items and rng.random() < rescan_ratio:
+            items.append(items[-stations] if len(items) >= stations else
+                         items[-1])
+        elif rng.random() < unknown_ratio:
+            items.append(f'CNX{i:07d}')
+        else:
+            items.append(rng.choice(serials))
+
+    latencies, errors, duration = await run_stations(
+        stations, items,
+        lambda index, serial: handlers[index].handle_input(serial=serial))
+    return summarize('firmware scans', latencies, errors, duration)
+
+
+async def bench_decomission(cen_dec: CentralDecomission, mock: MockCentral,
+                            stations: int, scans: int) -> typing.Dict:
+    """
+    Decommission flow. Every gateway is scanned twice: check, then delete.
+    """
+    handlers = [
+        DecomissionHandler(cen_dec, comm_handler=NullCommunicationHandler())
+        for _ in range(stations)
+    ]
+    serials = list(mock.gateways)[:max(1, scans // 2)]
+
+    async def scan_twice(index: int, serial: str):
+        for _ in range(2):
+            await handlers[index].handle_input(serial=serial,
+                                               options={'unlicense': False})
+
+    latencies, errors, duration = await run_stations(stations, serials,
+                                                     scan_twice)
+    # Each item was two scans
+    result = summarize('decommission scans', [l / 2 for l in latencies],
+                       errors, duration)
+    result['scans'] = len(latencies) * 2
+    result['scans_per_s'] = round(result['scans'] / duration, 1)
+    return result
+
+
+async def run(args) -> typing.Dict:
+    mock = mock_from_arguments(args)
+    base_url = await mock.start()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        mock.write_config(config_dir, base_url)
+        stack = CentralStack(base_url=base_url,
+                             client_id_file=os.path.join(
+                                 config_dir, 'client_id.json'),
+                             credential_file=os.path.join(
+                                 config_dir, 'credential.json'),
+                             max_connections=args.max_connections,
+                             rate_limit=args.client_rate_limit,
+                             max_retries=args.max_retries,
+                             coalesce_ttl=args.coalesce_ttl)
+        cfu = CentralFirmwareUpgrade(
+            central_client=stack.client,
+            group=args.group,
+            max_in_flight_pages=args.max_in_flight_pages)
+        cen_dec = CentralDecomission(central_client=stack.client,
+                                     device_type='all')
+
+        try:
+            results = await bench_refresh(cfu, cen_dec, stack.coalescing)
+            results.append(await bench_firmware(cfu, mock, args.stations,
+                                                args.scans, args.rescan_ratio,
+                                                args.unknown_ratio, rng))
+            results.append(await bench_decomission(cen_dec, mock,
+                                                   args.stations, args.scans))
+        finally:
+            await stack.close()
+            await mock.stop()
+
+    return {
+        'results': results,
+        'central': stack.status_providers()['quota'](),
+        'mock': mock.stats()
+    }
+
+
+def print_report(report: typing.Dict):
+    columns = ('name', 'duration_s', 'scans', 'errors', 'scans_per_s',
+               'p50_ms', 'p99_ms')
+    rows = [[str(result.get(column, '')) for column in columns]
+            for result in report['results']]
+    widths = [
+        max(len(column), *[len(row[i]) for row in rows])
+        for i, column in enumerate(columns)
+    ]
+    print('  '.join(column.ljust(widths[i])
+                    for i, column in enumerate(columns)))
+    for row in rows:
+        print('  '.join(value.ljust(widths[i]) for i, value in enumerate(row)))
+    print()
+    print('Central requests:', sum(report['mock']['requests'].values()),
+          'statuses:', report['mock']['statuses'])
+
+
+def main():
+    gettext.translation('messages',
+                        os.path.join(os.path.dirname(__file__), '..',
+                                     'locale'),
+                        languages=['en'],
+                        fallback=True).install()
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the firmware and decommission flows against a local mock of Central')
+    add_mock_arguments(parser)
+    parser.add_argument('--stations',
+                        type=int,
+                        default=8,
+                        help='Concurrent scanning stations')
+    parser.add_argument('--scans',
+                        type=int,
+                        default=400,
+                        help='Scans per flow')
+    parser.add_argument('--rescan-ratio',
+                        type=float,
+                        default=0.1,
+                        help='Share of firmware scans repeating a serial')
+    parser.add_argument('--unknown-ratio',
+                        type=float,
+                        default=0.05,
+                        help='Share of firmware scans of unknown serials')
+    parser.add_argument('--client-rate-limit',
+                        type=float,
+                        default=1000,
+                        help='Rate limit of the tool in calls per second')
+    parser.add_argument('--max-connections', type=int, default=20)
+    parser.add_argument('--max-in-flight-pages', type=int, default=4)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--coalesce-ttl', type=float, default=2)
+    parser.add_argument('--json',
+                        help='Write the results to this file for comparison')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
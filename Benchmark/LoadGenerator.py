@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import typing
+
+import aiohttp
+
+from Benchmark.Benchmark import percentile
+from Benchmark.MockCentral import fleet_serials
+
+PATHS = {'firmware': '/firmware/ws', 'decomission': '/decomission/ws'}
+
+
+class ScanResult(typing.NamedTuple):
+    serial: str
+    latency: float  # Seconds from sending the serial to its final status
+    status: typing.Union[str, None]  # Final status or None if only logs
+
+
+class Station():
+    """
+    Simulated browser client of a scan station.
+
+    Sends `status: connected` and then streams serials at a fixed interval,
+    without waiting for the answer (like an operator with a scanner). The
+    tool answers every serial with a `clear` frame followed by logs and
+    status frames, so the frames are split at `clear` to match them to the
+    scans.
+    """
+
+    def __init__(self,
+                 url: str,
+                 serials: typing.List[str],
+                 interval: float,
+                 unlicense: bool = False,
+                 idle_timeout: float = 5) -> None:
+        self.url = url
+        self.serials = serials
+        self.interval = interval  # Seconds between two scans
+        self.unlicense = unlicense
+        self.idle_timeout = idle_timeout  # Seconds without frames after the last scan
+        self.finished_at = 0.0  # Time of the last received frame
+
+    async def run(self, session: aiohttp.ClientSession
+                  ) -> typing.Tuple[float, typing.List[ScanResult]]:
+        """
+        Returns the time until the station was ready and the scan results
+        """
+        async with session.ws_connect(self.url) as ws:
+            start = time.perf_counter()
+            await ws.send_json({'type': 'status', 'value': 'connected'})
+            # Connecting is answered with: clear, (logs), (excel), clear
+            clears = 0
+            while clears < 2:
+                frame = await self.receive(ws, timeout=None)
+                if frame is None:
+                    return time.perf_counter() - start, []
+                if frame['type'] == 'clear':
+                    clears += 1
+            connect_time = time.perf_counter() - start
+
+            sent_at: typing.List[float] = []
+            reader = asyncio.create_task(self.read_scans(ws, sent_at))
+            for serial in self.serials:
+                sent_at.append(time.perf_counter())
+                await ws.send_json({
+                    'type': 'serial',
+                    'value': serial,
+                    'unlicense': self.unlicense
+                })
+                await asyncio.sleep(self.interval)
+            results = await reader
+            await ws.send_str('close')
+            return connect_time, results
+
+    async def receive(self, ws: aiohttp.ClientWebSocketResponse,
+                      timeout: typing.Union[float, None]
+                      ) -> typing.Union[typing.Dict, None]:
+        try:
+            message = await ws.receive(timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if message.type != aiohttp.WSMsgType.TEXT:
+            return None
+        return json.loads(message.data)
+
+    async def read_scans(self, ws: aiohttp.ClientWebSocketResponse,
+                         sent_at: typing.List[float]
+                         ) -> typing.List[ScanResult]:
+        last_frame_at: typing.List[float] = []
+        last_status_at: typing.List[typing.Union[float, None]] = []
+        last_status: typing.List[typing.Union[str, None]] = []
+
+        while True:
+            done = len(last_frame_at) >= len(self.serials)
+            frame = await self.receive(
+                ws, timeout=self.idle_timeout if done else None)
+            if frame is None:
+                break  # Idle after the last scan or connection closed
+            now = time.perf_counter()
+            self.finished_at = now
+            if frame['type'] == 'clear':
+                # Start of the answer to the next serial
+                last_frame_at.append(now)
+                last_status_at.append(None)
+                last_status.append(None)
+                continue
+            if not last_frame_at:
+                continue
+            last_frame_at[-1] = now
+            if frame['type'] == 'status':
+                last_status_at[-1] = now
+                last_status[-1] = frame['value']
+
+        results = []
+        for i, frame_at in enumerate(last_frame_at):
+            end = last_status_at[i] or frame_at
+            results.append(
+                ScanResult(serial=self.serials[i],
+                           latency=end - sent_at[i],
+                           status=last_status[i]))
+        return results
+
+
+def build_plan(serials: typing.List[str], scans: int, rescan_ratio: float,
+               rng: random.Random) -> typing.List[str]:
+    """
+    Serials to scan. A share of the scans repeats the previous serial, which
+    escalates (firmware) or deletes (decomission).
+    """
+    plan: typing.List[str] = []
+    while len(plan) < scans:
+        plan.append(rng.choice(serials))
+        if len(plan) < scans and rng.random() < rescan_ratio:
+            plan.append(plan[-1])
+    return plan
+
+
+async def run_level(url: str, serials: typing.List[str], stations: int,
+                    args, rng: random.Random) -> typing.Dict:
+    """
+    Run `stations` concurrent stations and summarize their scans
+    """
+    station_list = [
+        Station(url,
+                build_plan(serials, args.scans, args.rescan_ratio, rng),
+                interval=args.interval,
+                unlicense=args.unlicense,
+                idle_timeout=args.idle_timeout) for _ in range(stations)
+    ]
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        runs = await asyncio.gather(
+            *[station.run(session) for station in station_list])
+        # Until the last answer, without the idle timeout
+        duration = max(station.finished_at
+                       for station in station_list) - start
+
+    connect_times = [connect_time for connect_time, _ in runs]
+    results = [result for _, scan_results in runs for result in scan_results]
+    latencies = [result.latency for result in results]
+    return {
+        'stations': stations,
+        'scans': len(results),
+        'lost': stations * args.scans - len(results),
+        'no_status': len([r for r in results if r.status is None]),
+        'duration_s': round(duration, 2),
+        'scans_per_s': round(len(results) / duration, 1),
+        'connect_p99_ms': round(percentile(connect_times, 99) * 1000, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies, default=0) * 1000, 1)
+    }
+
+
+def load_serials(args) -> typing.List[str]:
+    if args.serials:
+        with open(args.serials, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    fleet = fleet_serials(args.gateways, args.switches, args.aps)
+    if args.module == 'decomission':
+        return fleet['gateways']  # Only gateways can be deleted
+    return [serial for serials in fleet.values() for serial in serials]
+
+
+def print_report(levels: typing.List[typing.Dict]):
+    columns = list(levels[0].keys())
+    widths = [
+        max(len(column), *[len(str(level[column])) for level in levels])
+        for column in columns
+    ]
+    print('  '.join(column.ljust(widths[i])
+                    for i, column in enumerate(columns)))
+    for level in levels:
+        print('  '.join(
+            str(level[column]).ljust(widths[i])
+            for i, column in enumerate(columns)))
+
+
+async def run(args) -> typing.List[typing.Dict]:
+    url = args.url.rstrip('/') + PATHS[args.module]
+    serials = load_serials(args)
+    rng = random.Random(args.seed)
+
+    levels = []
+    for stations in args.stations:
+        print(f'{stations} stations on {url}')
+        levels.append(await run_level(url, serials, stations, args, rng))
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate scan stations against the websocket endpoints of a running tool. '
+        'Decomission scans delete devices. Only run it against a tool using the mock of Central (Benchmark/MockCentral.py)'
+    )
+    parser.add_argument('--url',
+                        default='http://127.0.0.1:8080',
+                        help='Base url of the tool')
+    parser.add_argument('--module',
+                        choices=list(PATHS),
+                        default='firmware')
+    parser.add_argument(
+        '--stations',
+        type=lambda value: [int(count) for count in value.split(',')],
+        default=[1, 2, 4, 8, 16],
+        help='Comma separated station counts to run one after another')
+    parser.add_argument('--scans',
+                        type=int,
+                        default=50,
+                        help='Scans per station')
+    parser.add_argument('--interval',
+                        type=float,
+                        default=0.5,
+                        help='Seconds between two scans of a station')
+    parser.add_argument('--rescan-ratio',
+                        type=float,
+                        default=0.2,
+                        help='Share of serials scanned twice in a row')
+    parser.add_argument('--unlicense',
+                        action='store_true',
+                        help='Unassign the license on decomission re-scans')
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        default=5,
+        help='Seconds without frames after which the last scan is done')
+    parser.add_argument(
+        '--serials',
+        help='File with one serial per line. Defaults to the serials of the mock')
+    parser.add_argument('--gateways', type=int, default=500)
+    parser.add_argument('--switches', type=int, default=500)
+    parser.add_argument('--aps', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args()
+
+    levels = asyncio.run(run(args))
+    print_report(levels)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(levels, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,519 @@
+import argparse
+import asyncio
+import collections
+import json
+import os.path
+import random
+import time
+import typing
+import uuid
+
+from aiohttp import web
+
+FIRMWARE = {
+    'CONTROLLER': '10.4.0.0_85000',
+    'HP': '16.11.0010',
+    'CX': '10.11.1010',
+    'IAP': '8.10.0.6_86200'
+}
+
+OUTDATED_FIRMWARE = {
+    'CONTROLLER': '8.10.0.2_84000',
+    'HP': '16.10.0003',
+    'CX': '10.10.1000',
+    'IAP': '8.7.0.0_84688'
+}
+
+SERVICES = {
+    'GATEWAY': ['advance_90xx_sec'],
+    'SWITCH': ['foundation_switch_6200'],
+    'AP': ['advanced_ap']
+}
+
+
+def fleet_serials(gateways: int, switches: int,
+                  aps: int) -> typing.Dict[str, typing.List[str]]:
+    """
+    Serials of the generated fleet: `CNG…` (gateways), `CNS…` (switches) and
+    `CNA…` (aps)
+    """
+    return {
+        'gateways': [f'CNG{i:07d}' for i in range(gateways)],
+        'switches': [f'CNS{i:07d}' for i in range(switches)],
+        'aps': [f'CNA{i:07d}' for i in range(aps)]
+    }
+
+
+def json_response(
+        data,
+        status: int = 200,
+        headers: typing.Union[typing.Dict[str, str],
+                              None] = None) -> web.Response:
+    """
+    JSON response with a plain `application/json` content type like central
+    (decorest only decodes that exact type)
+    """
+    return web.Response(body=json.dumps(data).encode(),
+                        status=status,
+                        headers=headers,
+                        content_type='application/json')
+
+
+class MockCentral():
+    """
+    Local stand-in for the Central endpoints used by `CentralAPI.Central`.
+
+    Serves a generated fleet of gateways, switches and aps including the
+    device inventory, firmware status/compliance, moves, deletes, unassigns
+    and the oauth2 token refresh. Latency, error rate and rate limits are
+    configurable, so the tool can be measured without a live tenant.
+    """
+
+    def __init__(self,
+                 gateways: int = 500,
+                 switches: int = 500,
+                 aps: int = 2000,
+                 group: str = 'default',
+                 outdated_ratio: float = 0.1,
+                 wrong_group_ratio: float = 0,
+                 latency: float = 0.05,
+                 latency_jitter: float = 0.02,
+                 inventory_latency: typing.Union[float, None] = None,
+                 error_rate: float = 0,
+                 rate_limit: typing.Union[int, None] = None,
+                 daily_quota: typing.Union[int, None] = None,
+                 token_expires_in: int = 7200,
+                 seed: int = 1) -> None:
+        self.group = group
+        self.latency = latency  # Seconds added to every response
+        self.latency_jitter = latency_jitter
+        # The device inventory is a lot slower than the other endpoints
+        self.inventory_latency = latency * 4 \
+            if inventory_latency is None else inventory_latency
+        self.error_rate = error_rate  # Share of requests failing with 503
+        self.rate_limit = rate_limit  # Requests per second or unlimited
+        self.daily_quota = daily_quota  # Requests per day or unlimited
+        self.token_expires_in = token_expires_in
+        self.random = random.Random(seed)
+
+        self.client_id = 'mock-client-id'
+        self.client_secret = 'mock-client-secret'
+        self.access_tokens = {'mock-access-token'}
+        self.refresh_tokens = {'mock-refresh-token'}
+
+        self.gateways: typing.Dict[str, typing.Dict] = {}
+        self.switches: typing.Dict[str, typing.Dict] = {}
+        self.aps: typing.Dict[str, typing.Dict] = {}
+        self.inventory: typing.Dict[str, typing.Dict] = {}
+        self.generate(gateways, switches, aps, outdated_ratio,
+                      wrong_group_ratio)
+
+        self.second = 0  # Current rate limit window
+        self.second_count = 0
+        self.day_count = 0
+        self.requests: typing.Counter[str] = collections.Counter()
+        self.statuses: typing.Counter[int] = collections.Counter()
+
+        self.runner: typing.Union[web.AppRunner, None] = None
+
+    def generate(self, gateways: int, switches: int, aps: int,
+                 outdated_ratio: float, wrong_group_ratio: float):
+        """
+        Generate the fleet with the serials of `fleet_serials`
+        """
+
+        def device(serial: str, firmware_type: str) -> typing.Dict:
+            outdated = self.random.random() < outdated_ratio
+            return {
+                'serial':
+                serial,
+                'name':
+                serial.lower(),
+                'group_name':
+                'unprovisioned'
+                if self.random.random() < wrong_group_ratio else self.group,
+                'firmware_version':
+                (OUTDATED_FIRMWARE if outdated else FIRMWARE)[firmware_type],
+                'status':
+                'Up'
+            }
+
+        serials = fleet_serials(gateways, switches, aps)
+        for serial in serials['gateways']:
+            self.gateways[serial] = device(serial, 'CONTROLLER')
+            self.inventory[serial] = self.inventory_record(serial, 'GATEWAY')
+        for i, serial in enumerate(serials['switches']):
+            switch_type = 'AOS-CX' if i % 2 else 'AOS-S'
+            self.switches[serial] = device(
+                serial, 'CX' if switch_type == 'AOS-CX' else 'HP')
+            self.switches[serial]['switch_type'] = switch_type
+            self.inventory[serial] = self.inventory_record(serial, 'SWITCH')
+        for serial in serials['aps']:
+            self.aps[serial] = device(serial, 'IAP')
+            self.inventory[serial] = self.inventory_record(serial, 'AP')
+
+    @staticmethod
+    def inventory_record(serial: str, device_type: str) -> typing.Dict:
+        return {
+            'serial': serial,
+            'device_type': device_type,
+            'services': list(SERVICES[device_type]),
+            'model': 'mock',
+            'macaddr': '00:00:00:00:00:00'
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_routes([
+            web.post('/oauth2/token', self.token_handler),
+            web.get('/monitoring/v1/gateways',
+                    self.listing_handler(self.gateways, 'gateways')),
+            web.get('/monitoring/v1/switches',
+                    self.listing_handler(self.switches, 'switches')),
+            web.get('/monitoring/v2/aps',
+                    self.listing_handler(self.aps, 'aps')),
+            web.get('/monitoring/v1/gateways/{serial}',
+                    self.device_handler(self.gateways)),
+            web.get('/monitoring/v1/switches/{serial}',
+                    self.device_handler(self.switches)),
+            web.get('/monitoring/v1/aps/{serial}',
+                    self.device_handler(self.aps)),
+            web.delete('/monitoring/v1/gateways/{serial}',
+                       self.delete_gateway_handler),
+            web.get('/platform/device_inventory/v1/devices',
+                    self.inventory_handler),
+            web.post('/platform/licensing/v1/subscriptions/unassign',
+                     self.unassign_handler),
+            web.get('/firmware/v1/status', self.firmware_status_handler),
+            web.get('/firmware/v1/upgrade/compliance_version',
+                    self.compliance_handler),
+            web.post('/configuration/v1/devices/move', self.move_handler),
+        ])
+        return app
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource
+        name = f'{request.method} {route.canonical if route else request.path}'
+        self.requests[name] += 1
+
+        response = await self.handle(request, handler)
+        self.statuses[response.status] += 1
+        return response
+
+    async def handle(self, request: web.Request,
+                     handler) -> web.StreamResponse:
+        if request.path != '/oauth2/token':
+            authorization = request.headers.get('Authorization', '')
+            if authorization[len('Bearer '):] not in self.access_tokens:
+                return json_response({'error': 'invalid_token'}, status=401)
+
+        headers = self.count_request()
+        if headers is None:
+            return json_response({'message': 'API rate limit exceeded'},
+                                 status=429,
+                                 headers={
+                                     'Retry-After': '1',
+                                     **self.rate_limit_headers()
+                                 })
+
+        latency = self.inventory_latency \
+            if request.path.startswith('/platform/device_inventory') \
+            else self.latency
+        await asyncio.sleep(
+            max(0, latency + self.random.uniform(-1, 1) * self.latency_jitter))
+
+        if self.random.random() < self.error_rate:
+            return json_response({'message': 'Service Unavailable'},
+                                 status=503,
+                                 headers=headers)
+
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def count_request(self) -> typing.Union[typing.Dict[str, str], None]:
+        """
+        Count the request against the rate limits.
+
+        Returns the rate limit headers or None if the request is throttled.
+        """
+        now = int(time.time())
+        if now != self.second:
+            self.second = now
+            self.second_count = 0
+        if self.rate_limit is not None and \
+                self.second_count >= self.rate_limit:
+            return None
+        if self.daily_quota is not None and \
+                self.day_count >= self.daily_quota:
+            return None
+        self.second_count += 1
+        self.day_count += 1
+        return self.rate_limit_headers()
+
+    def rate_limit_headers(self) -> typing.Dict[str, str]:
+        headers = {}
+        if self.rate_limit is not None:
+            headers['X-RateLimit-Limit-second'] = str(self.rate_limit)
+            headers['X-RateLimit-Remaining-second'] = str(
+                max(0, self.rate_limit - self.second_count))
+        if self.daily_quota is not None:
+            headers['X-RateLimit-Limit-day'] = str(self.daily_quota)
+            headers['X-RateLimit-Remaining-day'] = str(
+                max(0, self.daily_quota - self.day_count))
+        return headers
+
+    async def token_handler(self, request: web.Request):
+        query = request.query
+        if query.get('client_id') != self.client_id or \
+                query.get('client_secret') != self.client_secret or \
+                query.get('refresh_token') not in self.refresh_tokens:
+            return json_response({'error': 'invalid_grant'}, status=400)
+
+        self.refresh_tokens.discard(query['refresh_token'])
+        access_token = uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        self.access_tokens.add(access_token)
+        self.refresh_tokens.add(refresh_token)
+        return json_response({
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'expires_in': self.token_expires_in,
+            'token_type': 'bearer'
+        })
+
+    @staticmethod
+    def page(request: web.Request,
+             devices: typing.List[typing.Dict]) -> typing.List[typing.Dict]:
+        offset = int(request.query.get('offset') or 0)
+        limit = int(request.query.get('limit') or 1000)
+        return devices[offset:offset + limit]
+
+    def listing_handler(self, devices: typing.Dict[str, typing.Dict],
+                        key: str):
+
+        async def handler(request: web.Request):
+            page = self.page(request, list(devices.values()))
+            return json_response({
+                'count': len(page),
+                'total': len(devices),
+                key: page
+            })
+
+        return handler
+
+    def device_handler(self, devices: typing.Dict[str, typing.Dict]):
+
+        async def handler(request: web.Request):
+            device = devices.get(request.match_info['serial'])
+            if device is None:
+                return json_response({'message': 'Not found'}, status=404)
+            return json_response(device)
+
+        return handler
+
+    async def delete_gateway_handler(self, request: web.Request):
+        serial = request.match_info['serial']
+        if self.gateways.pop(serial, None) is None:
+            return json_response({'message': 'Not found'}, status=404)
+        self.inventory.pop(serial, None)
+        return json_response({'message': 'Deleted'})
+
+    async def inventory_handler(self, request: web.Request):
+        sku_type = request.query.get('sku_type', 'all')
+        devices = [
+            device for device in self.inventory.values()
+            if sku_type == 'all' or device['device_type'] == sku_type
+        ]
+        return json_response({
+            'devices': self.page(request, devices),
+            'total': len(devices)
+        })
+
+    async def unassign_handler(self, request: web.Request):
+        data = await request.json()
+        for serial in data['serials']:
+            device = self.inventory.get(serial)
+            if device is None:
+                return json_response(
+                    {
+                        'message': f'{serial} not found',
+                        'status': 'failed'
+                    },
+                    status=500)
+            device['services'] = [
+                service for service in device['services']
+                if service not in data['services']
+            ]
+        return json_response({'response': 'success'})
+
+    def find_device(self, serial: str) -> typing.Union[typing.Dict, None]:
+        return self.gateways.get(serial) or self.switches.get(
+            serial) or self.aps.get(serial)
+
+    def target_firmware(self, serial: str) -> typing.Union[str, None]:
+        if serial in self.gateways:
+            return FIRMWARE['CONTROLLER']
+        if serial in self.switches:
+            return FIRMWARE['CX' if self.switches[serial]['switch_type'] ==
+                            'AOS-CX' else 'HP']
+        if serial in self.aps:
+            return FIRMWARE['IAP']
+        return None
+
+    async def firmware_status_handler(self, request: web.Request):
+        serial = request.query.get('serial', '')
+        device = self.find_device(serial)
+        if device is None:
+            return json_response({'message': 'Not found'}, status=404)
+        if device['firmware_version'] == self.target_firmware(serial):
+            return json_response({
+                'state': 'success',
+                'reason': 'Firmware is up to date',
+                'firmware_scheduled_at': 0
+            })
+        return json_response({
+            'state': 'in_progress',
+            'reason': 'Queued request to upgrade firmware',
+            'firmware_scheduled_at': 0
+        })
+
+    async def compliance_handler(self, request: web.Request):
+        device_type = request.query.get('device_type')
+        if request.query.get('group') != self.group or \
+                device_type not in FIRMWARE:
+            return json_response({'message': 'Not found'}, status=404)
+        return json_response({
+            'firmware_compliance_version':
+            FIRMWARE[device_type],
+            'compliance_scheduled_at':
+            0
+        })
+
+    async def move_handler(self, request: web.Request):
+        data = await request.json()
+        for serial in data['serials']:
+            device = self.find_device(serial)
+            if device is None:
+                return json_response({'description': f'{serial} not found'},
+                                     status=500)
+            device['group_name'] = data['group']
+        return json_response({
+            'description':
+            'Controller/Gateway group move has been initiated, please check audit trail for details'
+        })
+
+    def write_config(self, directory: str, base_url: str):
+        """
+        Write endpoint, client id and credential files pointing to this mock
+        """
+        files = {
+            'endpoint.json': {
+                'base_url': base_url
+            },
+            'client_id.json': {
+                'client_id': self.client_id,
+                'client_secret': self.client_secret
+            },
+            'credential.json': {
+                'access_token': next(iter(self.access_tokens)),
+                'refresh_token': next(iter(self.refresh_tokens)),
+                'expires_in': self.token_expires_in,
+                'created_at': int(time.time())
+            }
+        }
+        for filename, data in files.items():
+            with open(os.path.join(directory, filename), 'w') as f:
+                json.dump(data, f, indent=2)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Serve in the running event loop. Returns the base url.
+        """
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        return f'http://{host}:{port}'
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def stats(self) -> typing.Dict:
+        return {
+            'requests': dict(self.requests),
+            'statuses': dict(self.statuses)
+        }
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--gateways', type=int, default=500)
+    parser.add_argument('--switches', type=int, default=500)
+    parser.add_argument('--aps', type=int, default=2000)
+    parser.add_argument('--group', default='default')
+    parser.add_argument('--outdated-ratio',
+                        type=float,
+                        default=0.1,
+                        help='Share of devices not on the target firmware')
+    parser.add_argument('--wrong-group-ratio',
+                        type=float,
+                        default=0,
+                        help='Share of devices outside of --group')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.05,
+                        help='Seconds added to every response')
+    parser.add_argument('--latency-jitter', type=float, default=0.02)
+    parser.add_argument(
+        '--inventory-latency',
+        type=float,
+        help='Seconds added to device inventory responses. Defaults to 4x --latency')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0,
+                        help='Share of requests failing with 503')
+    parser.add_argument('--rate-limit',
+                        type=int,
+                        help='Requests per second before returning 429')
+    parser.add_argument('--daily-quota', type=int)
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def mock_from_arguments(args) -> MockCentral:
+    return MockCentral(gateways=args.gateways,
+                       switches=args.switches,
+                       aps=args.aps,
+                       group=args.group,
+                       outdated_ratio=args.outdated_ratio,
+                       wrong_group_ratio=args.wrong_group_ratio,
+                       latency=args.latency,
+                       latency_jitter=args.latency_jitter,
+                       inventory_latency=args.inventory_latency,
+                       error_rate=args.error_rate,
+                       rate_limit=args.rate_limit,
+                       daily_quota=args.daily_quota,
+                       seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of Central')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument(
+        '--config-dir',
+        help='Write endpoint.json, client_id.json and credential.json for this mock to this directory')
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock = mock_from_arguments(args)
+    if args.config_dir:
+        mock.write_config(args.config_dir, f'http://{args.host}:{args.port}')
+    web.run_app(mock.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
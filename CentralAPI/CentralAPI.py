@@ -1,5 +1,5 @@
 import json
-
+import sys
 import typing
 
 from decorest import (GET, PATCH, POST, PUT, DELETE, HTTPErrorWrapper,
@@ -15,11 +15,83 @@ CENTRAL_SERVICES = typing.Literal['pa', 'foundation_switch_6200', 'clarity',
                                   'advance_90xx_sec', 'cloud_guest']
 
 
-class DeviceDetailsSkeleton(typing.NamedTuple):
-    group_name: str
-    serial: str
-    firmware_version: str
-    status: str
+def intern_str(value: typing.Union[str, None]) -> typing.Union[str, None]:
+    if value is None:
+        return None
+    return sys.intern(value)
+
+
+# Interned service tuples. A fleet only uses a handful of combinations
+_services_cache: typing.Dict[typing.Tuple[str, ...],
+                            typing.Tuple[str, ...]] = {}
+
+
+def intern_services(
+        services: typing.Union[typing.Iterable[str], None]
+) -> typing.Union[typing.Tuple[str, ...], None]:
+    if services is None:
+        return None
+    key = tuple(sys.intern(service) for service in services)
+    return _services_cache.setdefault(key, key)
+
+
+class DeviceDetails():
+    """
+    Compact record with the device fields used by the modules.
+
+    Values repeated across the fleet (group, firmware, status, types and
+    services) are interned, so large tenants only keep one copy of them.
+    """
+
+    __slots__ = ('serial', 'group_name', 'firmware_version', 'status',
+                 'switch_type', 'device_type', 'services')
+
+    def __init__(
+            self,
+            serial: str,
+            group_name: typing.Union[str, None] = None,
+            firmware_version: typing.Union[str, None] = None,
+            status: typing.Union[str, None] = None,
+            switch_type: typing.Union[str, None] = None,
+            device_type: typing.Union[str, None] = None,
+            services: typing.Union[typing.Iterable[str], None] = None) -> None:
+        self.serial = serial
+        self.group_name = intern_str(group_name)
+        self.firmware_version = intern_str(firmware_version)
+        self.status = intern_str(status)
+        self.switch_type = intern_str(switch_type)
+        self.device_type = intern_str(device_type)
+        self.services = intern_services(services)
+
+    @classmethod
+    def from_central(cls, data: typing.Dict) -> 'DeviceDetails':
+        """
+        Build a record from a monitoring or inventory response item
+        """
+        return cls(serial=data['serial'],
+                   group_name=data.get('group_name'),
+                   firmware_version=data.get('firmware_version'),
+                   status=data.get('status'),
+                   switch_type=data.get('switch_type'),
+                   device_type=data.get('device_type'),
+                   services=data.get('services'))
+
+    def to_dict(self) -> typing.Dict:
+        return {
+            field: getattr(self, field)
+            for field in self.__slots__
+            if getattr(self, field) is not None
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DeviceDetails):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field)
+            for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f'<DeviceDetails {self.to_dict()}>'
 
 
 class UnassignSubscriptionType(typing.TypedDict):
@@ -194,6 +266,67 @@ class Central(RestClient):
             }]
         }
 
+    @GET('monitoring/v1/gateways/{serial}')
+    @accept('application/json')
+    @on(200, lambda r: r.json())
+    @on(404, lambda _: None)
+    async def get_gateway(self, serial: str) -> typing.Union[typing.Dict, None]:
+        """
+        Get gateway details. Returns `None` if the gateway is not known.
+
+        ---
+
+        https://developer.arubanetworks.com/aruba-central/reference/apiexternal_controllerget_gateway
+        """
+        # Example
+        return {
+            'firmware_version': 'string',
+            'group_name': 'default',
+            'serial': 'string',
+            'status': 'Up'
+        }
+
+    @GET('monitoring/v1/switches/{serial}')
+    @accept('application/json')
+    @on(200, lambda r: r.json())
+    @on(404, lambda _: None)
+    async def get_switch(self, serial: str) -> typing.Union[typing.Dict, None]:
+        """
+        Get switch details. Returns `None` if the switch is not known.
+
+        ---
+
+        https://developer.arubanetworks.com/aruba-central/reference/apiexternal_controllerget_switch
+        """
+        # Example
+        return {
+            'firmware_version': '16.10.0003',
+            'group_name': 'unprovisioned',
+            'serial': 'CN80HKW4Z9',
+            'status': 'Up',
+            'switch_type': 'AOS-S'
+        }
+
+    @GET('monitoring/v1/aps/{serial}')
+    @accept('application/json')
+    @on(200, lambda r: r.json())
+    @on(404, lambda _: None)
+    async def get_ap(self, serial: str) -> typing.Union[typing.Dict, None]:
+        """
+        Get access point details. Returns `None` if the ap is not known.
+
+        ---
+
+        https://developer.arubanetworks.com/aruba-central/reference/apiexternal_controllerget_ap
+        """
+        # Example
+        return {
+            'firmware_version': '8.3.0.0_63709',
+            'group_name': 'group1',
+            'serial': 'Ap123456',
+            'status': 'Down'
+        }
+
     @POST('configuration/v1/devices/move')
     @accept('application/json')
     @content('application/json')
@@ -256,7 +389,7 @@ class Central(RestClient):
         "compliance_scheduled_at": 0,
         "firmware_compliance_version": None
     })
-    def get_firmware_compliance(
+    async def get_firmware_compliance(
             self, group: str,
             device_type: FIRMWARE_DEVICE_TYPE) -> typing.Dict:
         """
@@ -323,7 +456,7 @@ class Central(RestClient):
     @accept('application/json')
     @on(200, lambda r: r.json())
     @on(404, lambda _: False)
-    def delete_gateway(self, serial) -> bool:
+    async def delete_gateway(self, serial) -> bool:
         """
         Delete gateway
 
@@ -340,7 +473,7 @@ class Central(RestClient):
     @on(200, lambda r: r.json())
     @on(500, lambda r: r.json())
     @body('data', lambda data: json.dumps(data))
-    def unassign_subscription_device(
+    async def unassign_subscription_device(
             self, data: UnassignSubscriptionType) -> typing.Dict:
         """
         This API is used to unassign subscriptions to device by specifying its serial. 
@@ -0,0 +1,97 @@
+import time
+import typing
+
+from CentralAPI.CentralProxy import CentralProxy
+from Helper.SingleFlight import SingleFlight
+
+
+class CoalescingCentral(CentralProxy):
+    """
+    Shares identical in-flight read calls (`get_*`).
+
+    Concurrent calls with the same method and arguments join one request to
+    central and receive the same result. With `result_ttl` results are kept
+    for that many seconds to absorb bursts, f.e. operators re-scanning the
+    same serial.
+
+    Results are shared between callers and must not be modified. Any other
+    call (moves, deletes, unassigns) may change what central returns, so it
+    drops all kept results and later reads never join a read started before
+    it.
+    """
+
+    def __init__(self, inner, result_ttl: float = 0) -> None:
+        super().__init__(inner)
+        self.result_ttl = result_ttl
+        self.single_flight = SingleFlight()
+        self.results: typing.Dict[typing.Hashable, typing.Tuple[float,
+                                                                typing.Any]] = {}
+
+        # Incremented around every write. Part of the key, so reads do not
+        # share results across a write
+        self.generation = 0
+
+        self.calls_total = 0
+        self.coalesced_total = 0
+
+    @staticmethod
+    def make_key(name: str, args,
+                 kwargs) -> typing.Union[typing.Hashable, None]:
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None  # Unhashable arguments, f.e. dicts
+        return key
+
+    async def call(self, name, method, *args, **kwargs):
+        if not name.startswith('get_'):
+            return await self.write(method, *args, **kwargs)
+
+        key = self.make_key(name, args, kwargs)
+        if key is None:
+            return await method(*args, **kwargs)
+        key = (self.generation, key)
+
+        self.calls_total += 1
+        cached = self.results.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.coalesced_total += 1
+            return cached[1]
+
+        if self.single_flight.is_in_flight(key):
+            self.coalesced_total += 1
+        return await self.single_flight.do(
+            key, lambda: self.load(key, method, *args, **kwargs))
+
+    async def write(self, method, *args, **kwargs):
+        self.invalidate()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            # Reads started while the write was running may be outdated
+            self.invalidate()
+
+    def invalidate(self):
+        self.generation += 1
+        self.results = {}
+
+    async def load(self, key, method, *args, **kwargs):
+        result = await method(*args, **kwargs)
+        if self.result_ttl > 0 and key[0] == self.generation:
+            now = time.monotonic()
+            if len(self.results) > 1024:
+                # Drop expired results
+                self.results = {
+                    k: v
+                    for k, v in self.results.items() if v[0] > now
+                }
+            self.results[key] = (now + self.result_ttl, result)
+        return result
+
+    def stats(self) -> typing.Dict:
+        return {
+            'calls_total': self.calls_total,
+            'coalesced_total': self.coalesced_total,
+            'in_flight': len(self.single_flight.in_flight)
+        }
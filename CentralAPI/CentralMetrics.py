@@ -0,0 +1,37 @@
+from decorest import HTTPErrorWrapper
+
+from CentralAPI.CentralProxy import CentralProxy, error_response
+from Metrics.Metrics import registry
+
+call_duration = registry.histogram(
+    'central_call_duration_seconds',
+    'Seconds per Central API call attempt by API method', ('method', ))
+calls = registry.counter(
+    'central_calls_total',
+    'Central API call attempts by API method and outcome (ok, status code '
+    'of a failed call or error name)', ('method', 'outcome'))
+
+
+class InstrumentedCentral(CentralProxy):
+    """
+    Records latency and outcome of every call attempt per API method.
+
+    Placed right above the transport, so the latency excludes rate limit
+    waits and retry backoff.
+    """
+
+    async def call(self, name, method, *args, **kwargs):
+        outcome = 'ok'
+        try:
+            with call_duration.time(method=name):
+                return await method(*args, **kwargs)
+        except HTTPErrorWrapper as e:
+            response = error_response(e)
+            outcome = str(response.status_code) if response is not None \
+                else type(e.wrapped).__name__
+            raise
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            calls.inc(method=name, outcome=outcome)
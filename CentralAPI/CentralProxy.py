@@ -0,0 +1,51 @@
+import asyncio
+import typing
+
+import httpx
+from decorest import HTTPErrorWrapper
+
+from CentralAPI.CentralAPI import Central
+
+
+def error_response(
+        error: HTTPErrorWrapper) -> typing.Union[httpx.Response, None]:
+    """
+    Returns the response of a failed call or None if no response was received
+    (f.e. connection errors and timeouts)
+    """
+    return getattr(error.wrapped, 'response', None)
+
+
+class CentralProxy():
+    """
+    Forwards every Central API call to `inner` through `call`.
+
+    Layers in front of the client (connection pooling, rate limiting,
+    retries, ...) subclass this and override `call`. Proxies can be stacked,
+    the innermost one wraps the `Central` client itself.
+    """
+
+    def __init__(self, inner: typing.Union[Central, 'CentralProxy']) -> None:
+        self.inner = inner
+
+    def __getattr__(self, name: str) -> typing.Any:
+        method = getattr(self.inner, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        async def invoker(*args, **kwargs):
+            return await self.call(name, method, *args, **kwargs)
+
+        return invoker
+
+    async def call(self, name: str, method: typing.Callable[...,
+                                                            typing.Awaitable],
+                   *args, **kwargs) -> typing.Any:
+        return await method(*args, **kwargs)
+
+    async def close_(self):
+        """
+        Release resources held by this and all inner proxies
+        """
+        if isinstance(self.inner, CentralProxy):
+            await self.inner.close_()
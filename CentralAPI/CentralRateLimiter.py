@@ -0,0 +1,198 @@
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import heapq
+import itertools
+import time
+import typing
+
+import httpx
+from decorest import HTTPErrorWrapper
+
+from CentralAPI.CentralProxy import CentralProxy, error_response
+from Metrics.Metrics import registry
+
+PRIORITY_INTERACTIVE = 0  # Scan lookups, moves, deletes
+PRIORITY_BACKGROUND = 10  # Fleet syncs, preloading
+
+rate_limit_wait = registry.histogram(
+    'central_rate_limit_wait_seconds',
+    'Seconds Central calls waited for the rate limit by priority',
+    ('priority', ))
+throttled = registry.counter('central_throttled_total',
+                             'Central calls answered with 429')
+
+central_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    'central_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def background_priority():
+    """
+    Central calls made within this context (and tasks started from it) yield
+    to interactive calls when the rate limit is reached.
+    """
+    token = central_priority.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        central_priority.reset(token)
+
+
+class TokenBucket():
+    """
+    Token bucket handing out tokens to waiters by priority (lowest first) and
+    arrival order.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate  # Tokens per second
+        self.burst = burst  # Bucket size
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+        self.waiters: typing.List[typing.Tuple[int, int,
+                                               asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.wakeup_handle: typing.Union[asyncio.TimerHandle, None] = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        self.refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+        self.schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Token was granted but won't be used
+                self.tokens += 1
+            raise
+
+    def pause(self, seconds: float):
+        """
+        Hand out no tokens for the next `seconds`
+        """
+        self.refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+        if self.wakeup_handle:
+            self.wakeup_handle.cancel()
+            self.wakeup_handle = None
+        self.schedule()
+
+    def schedule(self):
+        if self.wakeup_handle:
+            return
+        self.refill()
+        while self.waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue  # Waiter was cancelled
+            self.tokens -= 1
+            future.set_result(None)
+        if self.waiters:
+            delay = (1 - self.tokens) / self.rate
+            self.wakeup_handle = asyncio.get_running_loop().call_later(
+                delay, self.wakeup)
+
+    def wakeup(self):
+        self.wakeup_handle = None
+        self.schedule()
+
+
+class RateLimitedCentral(CentralProxy):
+    """
+    Schedules every Central call through a per tenant token bucket.
+
+    Interactive calls go before background calls once the bucket is empty.
+    Rate limit headers returned by central (see `observe_response`) and 429
+    responses pause the bucket. The remaining daily quota is kept for
+    operators in `quota`.
+    """
+
+    def __init__(self,
+                 inner,
+                 rate_limit: float = 7,
+                 daily_quota: typing.Union[int, None] = None,
+                 max_429_retries: int = 3) -> None:
+        super().__init__(inner)
+        self.bucket = TokenBucket(rate=rate_limit, burst=rate_limit)
+        self.max_429_retries = max_429_retries
+
+        self.daily_limit = daily_quota
+        self.daily_remaining: typing.Union[int, None] = None
+        self.requests_today = 0
+        self.today = datetime.date.today()
+        self.throttled_total = 0
+
+    async def call(self, name, method, *args, **kwargs):
+        priority = central_priority.get()
+        attempt = 0
+        while True:
+            with rate_limit_wait.time(priority=priority):
+                await self.bucket.acquire(priority)
+            self.count_request()
+            try:
+                return await method(*args, **kwargs)
+            except HTTPErrorWrapper as e:
+                response = error_response(e)
+                if response is None or response.status_code != 429 or \
+                        attempt >= self.max_429_retries:
+                    raise
+                self.throttled_total += 1
+                throttled.inc()
+                attempt += 1
+                self.bucket.pause(self.retry_after(response))
+
+    def count_request(self):
+        if self.today != datetime.date.today():
+            self.today = datetime.date.today()
+            self.requests_today = 0
+        self.requests_today += 1
+
+    @staticmethod
+    def retry_after(response: httpx.Response) -> float:
+        try:
+            return float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            return 1
+
+    async def observe_response(self, response: httpx.Response):
+        """
+        httpx response hook reading the rate limit headers of central
+        """
+        headers = response.headers
+        if 'X-RateLimit-Limit-day' in headers:
+            self.daily_limit = int(headers['X-RateLimit-Limit-day'])
+        if 'X-RateLimit-Remaining-day' in headers:
+            self.daily_remaining = int(headers['X-RateLimit-Remaining-day'])
+        if headers.get('X-RateLimit-Remaining-second') == '0':
+            # Second is used up. Wait for the next one
+            self.bucket.pause(1)
+
+    def quota(self) -> typing.Dict:
+        """
+        Returns the daily quota as reported by central or counted locally
+        """
+        remaining = self.daily_remaining
+        if remaining is None and self.daily_limit is not None:
+            remaining = max(0, self.daily_limit - self.requests_today)
+        return {
+            'per_second': self.bucket.rate,
+            'daily_limit': self.daily_limit,
+            'daily_remaining': remaining,
+            'requests_today': self.requests_today,
+            'throttled_total': self.throttled_total,
+            'waiting': len(self.bucket.waiters)
+        }
@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+import typing
+
+import httpx
+from decorest import HTTPErrorWrapper
+
+from CentralAPI.CentralProxy import CentralProxy, error_response
+from Metrics.Metrics import registry
+
+# Status codes which are worth another try. 429 is retried by the rate
+# limiter, which also knows how long to wait
+TRANSIENT_STATUS = (500, 502, 503, 504)
+
+# Errors raised before the request left the client. Central never saw it.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+retries = registry.counter('central_retries_total',
+                           'Retried Central API calls by API method',
+                           ('method', ))
+circuit_opened = registry.counter(
+    'central_circuit_opened_total',
+    'Times the circuit breaker started failing Central calls fast')
+
+
+class CentralUnavailable(Exception):
+    """
+    Raised without calling central while the circuit breaker is open
+    """
+
+    def __init__(self, retry_at: float) -> None:
+        self.retry_at = retry_at  # time.monotonic() of the next probe
+        super().__init__(
+            _('Central is not reachable. Retrying in {seconds:.0f}s').format(
+                seconds=max(0, retry_at - time.monotonic())))
+
+
+class CircuitBreaker():
+    """
+    Opens after `failure_threshold` consecutive failures and fails all calls
+    fast for `reset_timeout` seconds. Afterwards a single probe call is let
+    through which either closes the breaker again or reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+
+    def before_call(self):
+        if self.state == self.CLOSED:
+            return
+        retry_at = self.opened_at + self.reset_timeout
+        if self.state == self.OPEN and time.monotonic() >= retry_at:
+            self.state = self.HALF_OPEN  # This call is the probe
+            return
+        raise CentralUnavailable(retry_at)
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or \
+                self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f'Central degraded. Failing calls fast for '
+                      f'{self.reset_timeout}s')
+                self.opened_total += 1
+                circuit_opened.inc()
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryingCentral(CentralProxy):
+    """
+    Retries failed Central calls with jittered exponential backoff.
+
+    Reads (`get_*`) are retried on timeouts, connection errors and transient
+    status codes. Writes (moves, deletes, unassigns) are only retried if
+    central never processed the request (connection not established). 429 is
+    left to the rate limiter.
+    All calls go through a circuit breaker which fails fast while central is
+    degraded.
+    """
+
+    def __init__(self,
+                 inner,
+                 max_retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 10,
+                 breaker: typing.Union[CircuitBreaker, None] = None) -> None:
+        super().__init__(inner)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.retries_total = 0
+
+    async def call(self, name, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await method(*args, **kwargs)
+            except HTTPErrorWrapper as e:
+                if self.is_server_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    # Central answered, f.e. 4xx
+                    self.breaker.record_success()
+                if attempt >= self.max_retries or \
+                        not self.is_retryable(name, e):
+                    raise
+                attempt += 1
+                delay = self.backoff(attempt)
+                print(f'Retrying {name} in {delay:.1f}s '
+                      f'(attempt {attempt}/{self.max_retries}): {e!r}')
+            except BaseException:
+                # No answer of central, f.e. cancelled or an invalid response.
+                # A probe must not leave the breaker half open for good.
+                if self.breaker.state == self.breaker.HALF_OPEN:
+                    self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+            self.retries_total += 1
+            retries.inc(method=name)
+            await asyncio.sleep(delay)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full jitter: random delay up to the exponential backoff
+        """
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    @staticmethod
+    def is_read(name: str) -> bool:
+        return name.startswith('get_')
+
+    @staticmethod
+    def is_server_failure(error: HTTPErrorWrapper) -> bool:
+        response = error_response(error)
+        if response is None:
+            return isinstance(error.wrapped, httpx.TransportError)
+        return response.status_code >= 500
+
+    @classmethod
+    def is_retryable(cls, name: str, error: HTTPErrorWrapper) -> bool:
+        response = error_response(error)
+        if response is not None and response.status_code == 429:
+            return False  # Retried by the rate limiter
+        if isinstance(error.wrapped, NOT_SENT_ERRORS):
+            return True
+        if not cls.is_read(name):
+            # The write may have been applied already
+            return False
+        if response is None:
+            return isinstance(error.wrapped, httpx.TransportError)
+        return response.status_code in TRANSIENT_STATUS
+
+    def stats(self) -> typing.Dict:
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'opened_total': self.breaker.opened_total,
+            'retries_total': self.retries_total
+        }
@@ -0,0 +1,80 @@
+import typing
+
+from CentralAPI.CentralAPI import Central
+from CentralAPI.CentralCoalescer import CoalescingCentral
+from CentralAPI.CentralMetrics import InstrumentedCentral
+from CentralAPI.CentralRateLimiter import RateLimitedCentral
+from CentralAPI.CentralRetry import RetryingCentral
+from CentralAPI.CentralTransport import CentralTransport, PooledCentral
+from CentralTokenAuth.CentralTokenAuth import CentralTokenAuth
+
+
+class CentralStack():
+    """
+    Central client with all layers used by the tool.
+
+    Calls pass (outermost first) coalescing, retries, rate limiting,
+    instrumentation and the pooled transport. `client` is the entry point for
+    the modules.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 client_id_file: str,
+                 credential_file: str,
+                 max_connections: int = 20,
+                 keepalive_expiry: float = 30,
+                 http2: bool = False,
+                 rate_limit: float = 7,
+                 daily_quota: typing.Union[int, None] = None,
+                 max_retries: int = 3,
+                 coalesce_ttl: float = 2) -> None:
+        # Pooled connections shared by all requests to central
+        self.transport = CentralTransport(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+            http2=http2)
+
+        # Configure central api client using credential provided via `client_id_file` and `credential_file`
+        self.pooled = PooledCentral(Central(base_url,
+                                            backend='httpx',
+                                            auth=CentralTokenAuth(
+                                                base_url=base_url,
+                                                client_id_file=client_id_file,
+                                                credential_file=credential_file)),
+                                    transport=self.transport)
+
+        # Latency and outcome per API method
+        self.instrumented = InstrumentedCentral(self.pooled)
+
+        # Keep within the API quota of the tenant
+        self.rate_limiter = RateLimitedCentral(self.instrumented,
+                                               rate_limit=rate_limit,
+                                               daily_quota=daily_quota)
+        self.pooled.add_response_hook(self.rate_limiter.observe_response)
+
+        # Retry transient failures, every attempt is rate limited
+        self.retrying = RetryingCentral(self.rate_limiter,
+                                        max_retries=max_retries)
+
+        # Identical concurrent reads share one request
+        self.coalescing = CoalescingCentral(self.retrying,
+                                            result_ttl=coalesce_ttl)
+
+        self.client = typing.cast(Central, self.coalescing)
+
+    def status_providers(
+            self) -> typing.Dict[str, typing.Callable[[], typing.Any]]:
+        """
+        Statistics of every layer by name, f.e. for `/status`
+        """
+        return {
+            'transport': self.transport.stats,
+            'quota': self.rate_limiter.quota,
+            'circuit': self.retrying.stats,
+            'coalescing': self.coalescing.stats
+        }
+
+    async def close(self):
+        await self.coalescing.close_()
@@ -0,0 +1,105 @@
+import importlib.util
+import typing
+
+import httpx
+
+from CentralAPI.CentralAPI import Central
+from CentralAPI.CentralProxy import CentralProxy
+from Metrics.Metrics import registry
+
+responses = registry.counter(
+    'central_responses_total',
+    'HTTP responses received from central by status code', ('status', ))
+
+
+class CentralTransport(httpx.AsyncHTTPTransport):
+    """
+    Pooled transport shared by every Central request.
+
+    Keeps warm (optionally HTTP/2 multiplexed) connections to central, so
+    concurrent refreshes and decomission calls don't pay a new TLS handshake
+    each, and counts the requests passing through.
+    """
+
+    def __init__(self,
+                 max_connections: int = 20,
+                 max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30,
+                 http2: bool = False) -> None:
+        if http2 and importlib.util.find_spec('h2') is None:
+            # HTTP/2 support is an optional dependency of httpx
+            print('HTTP/2 requested but the h2 package is not installed. '
+                  'Falling back to HTTP/1.1')
+            http2 = False
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry)
+        self.http2 = http2
+        super().__init__(limits=self.limits, http2=http2)
+
+        self.requests_total = 0
+        self.requests_in_flight = 0
+
+    async def handle_async_request(self,
+                                   request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.requests_in_flight += 1
+        try:
+            response = await super().handle_async_request(request)
+        finally:
+            self.requests_in_flight -= 1
+        responses.inc(status=response.status_code)
+        return response
+
+    def stats(self) -> typing.Dict:
+        """
+        Returns the pool limits and current usage
+        """
+        connections = list(getattr(self._pool, 'connections', []))
+        return {
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections':
+            self.limits.max_keepalive_connections,
+            'keepalive_expiry': self.limits.keepalive_expiry,
+            'connections': len(connections),
+            'idle_connections':
+            sum(1 for connection in connections if connection.is_idle()),
+            'http2_connections':
+            sum(1 for connection in connections
+                if 'HTTP/2' in connection.info()),
+            'requests_total': self.requests_total,
+            'requests_in_flight': self.requests_in_flight
+        }
+
+
+class PooledCentral(CentralProxy):
+    """
+    Sends every call of `central_client` through one shared
+    `httpx.AsyncClient` on top of `transport`, instead of a new client and
+    connection per call.
+    """
+
+    def __init__(self, central_client: Central,
+                 transport: CentralTransport) -> None:
+        super().__init__(central_client)
+        self.transport = transport
+        self.http_client = httpx.AsyncClient(auth=central_client['auth'],
+                                             transport=transport)
+
+    def add_response_hook(
+            self, hook: typing.Callable[[httpx.Response], typing.Awaitable]):
+        """
+        Call `hook` with every response received from central
+        """
+        self.http_client.event_hooks['response'].append(hook)
+
+    async def call(self, name, method, *args, **kwargs):
+        # decorest executes requests within the passed session
+        kwargs['__session'] = self.http_client
+        return await method(*args, **kwargs)
+
+    async def close_(self):
+        await self.http_client.aclose()
@@ -1,14 +1,25 @@
+import asyncio
 import json
+import threading
+import time
+import typing
 from datetime import datetime, timedelta
 
 import httpx
 
+from CentralTokenAuth.CredentialWriter import CredentialWriter
+from Helper.EventLoopGuard import warn_if_blocking
+
 
 class CentralTokenAuth(httpx.Auth):
     requires_request_body = False
     requires_response_body = True
 
-    def __init__(self, base_url, client_id_file, credential_file):
+    def __init__(self,
+                 base_url,
+                 client_id_file,
+                 credential_file,
+                 refresh_margin: float = 300):
         self.credential_file = credential_file
         self.base_url = base_url
         self.client_id_file = client_id_file
@@ -35,19 +46,83 @@ class CentralTokenAuth(httpx.Auth):
 
         self.expiry = None
 
+        # Token updates are written to disk in the background
+        self.credential_writer = CredentialWriter(self.credential_file)
+
+        # Refresh this many seconds before the token expires
+        self.refresh_margin = refresh_margin
+        # Don't retry a failed proactive refresh before this time
+        self.retry_refresh_at = 0.0
+
+        # Only one refresh at a time. Waiting requests reuse the new token
+        self.sync_lock = threading.Lock()
+        self.async_lock: typing.Union[asyncio.Lock, None] = None
+
+    def needs_refresh(self) -> bool:
+        """
+        Returns `true` if the token expires within `self.refresh_margin`
+        (at most half of the token lifetime)
+        """
+        now = time.time()
+        # A margin as long as the token lifetime would refresh on every request
+        margin = min(self.refresh_margin, self.expires_in / 2)
+        return now >= self.retry_refresh_at and \
+            now >= self.created_at + self.expires_in - margin
+
     def auth_flow(self, request):
+        if self.needs_refresh():
+            with self.sync_lock:
+                # Another request might have refreshed while we waited
+                if self.needs_refresh():
+                    self.update_tokens((yield self.build_refresh_request()))
+
         # Send the request, with bearer.
-        request.headers['Authorization'] = f'Bearer {self.access_token}'
+        access_token = self.access_token
+        request.headers['Authorization'] = f'Bearer {access_token}'
         response = yield request
 
         if response.status_code == 401:
-            refresh_response = yield self.build_refresh_request()
-            self.update_tokens(refresh_response)
+            with self.sync_lock:
+                if self.access_token == access_token:
+                    self.update_tokens((yield self.build_refresh_request()))
 
             # Set new Bearer
             request.headers['Authorization'] = f'Bearer {self.access_token}'
             yield request
 
+    async def async_auth_flow(self, request):
+        if self.async_lock is None:
+            self.async_lock = asyncio.Lock()
+
+        if self.needs_refresh():
+            async with self.async_lock:
+                # Another request might have refreshed while we waited
+                if self.needs_refresh():
+                    refresh_response = yield self.build_refresh_request()
+                    await refresh_response.aread()
+                    self.update_tokens(refresh_response)
+
+        # Send the request, with bearer.
+        access_token = self.access_token
+        request.headers['Authorization'] = f'Bearer {access_token}'
+        response = yield request
+
+        if response.status_code == 401:
+            async with self.async_lock:
+                if self.access_token == access_token:
+                    refresh_response = yield self.build_refresh_request()
+                    await refresh_response.aread()
+                    self.update_tokens(refresh_response)
+
+            # Set new Bearer
+            request.headers['Authorization'] = f'Bearer {self.access_token}'
+            yield request
+
+    def sync_auth_flow(self, request):
+        # Only sync (blocking) requests pass here. Flag them on the event loop
+        warn_if_blocking(f'{request.method} {request.url}')
+        yield from super().sync_auth_flow(request)
+
     def build_refresh_request(self):
         return httpx.Request(method='POST',
                              url=f'{self.base_url}/oauth2/token',
@@ -69,23 +144,17 @@ class CentralTokenAuth(httpx.Auth):
                 timedelta(seconds=data['expires_in'])
             self.expires_in = data['expires_in']
             self.created_at = int(datetime.now().timestamp())
-            print('Expiry', self.expiry.isoformat())
             # Save the new credential to disk
             self.write_credentials_to_json()
+        else:
+            print('Token refresh failed', response.status_code)
+            self.retry_refresh_at = time.time() + 30
 
     def write_credentials_to_json(self):
-        with open(self.credential_file, 'r+') as f:
-            # Load the old data from file
-            cred_data = json.load(f)
-            print('Expires In', self.expires_in)
-            print('Created At', self.created_at)
-            # Overwrite the changed values
-            cred_data['access_token'] = self.access_token
-            cred_data['refresh_token'] = self.refresh_token
-            cred_data['expires_in'] = self.expires_in
-            cred_data['created_at'] = self.created_at
-            # Return to top
-            f.seek(0)
-            f.truncate(0)
-            # Dump the json to file and overwrite
-            json.dump(cred_data, f)
+        # Queued, the background writer merges the values into the file
+        self.credential_writer.submit({
+            'access_token': self.access_token,
+            'refresh_token': self.refresh_token,
+            'expires_in': self.expires_in,
+            'created_at': self.created_at
+        })
@@ -0,0 +1,109 @@
+import atexit
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+import typing
+
+
+class CredentialWriter():
+    """
+    Persists token updates to the credential file on a background thread.
+
+    Successive updates are coalesced, only the latest values are written. The
+    file is replaced atomically (temp file and rename), so a crash mid-write
+    never leaves a truncated credential file behind. Failed writes are
+    retried with backoff until they succeed.
+    """
+
+    def __init__(self,
+                 credential_file: str,
+                 retry_delay: float = 1,
+                 max_retry_delay: float = 60) -> None:
+        self.credential_file = credential_file
+        # Seconds between attempts if writing fails, doubled per failure
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.condition = threading.Condition()
+        self.pending: typing.Union[typing.Dict, None] = None
+        self.writing = False
+
+        self.thread = threading.Thread(target=self.run,
+                                       name='CredentialWriter',
+                                       daemon=True)
+        self.thread.start()
+        # Don't lose a token rotated right before the process exits
+        atexit.register(self.flush, 5)
+
+    def submit(self, values: typing.Dict):
+        """
+        Queue `values` to be merged into the credential file. Returns
+        immediately.
+        """
+        with self.condition:
+            self.pending = {**(self.pending or {}), **values}
+            self.condition.notify_all()
+
+    def flush(self, timeout: typing.Union[float, None] = None) -> bool:
+        """
+        Wait until all queued values are written. Returns `false` on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.pending is None and not self.writing, timeout)
+
+    def run(self):
+        delay = self.retry_delay
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                values, self.pending = self.pending, None
+                self.writing = True
+            failed = False
+            try:
+                self.write(values)  # type: ignore
+            except Exception as e:
+                failed = True
+                print('Saving credentials failed, retrying in', delay, 's',
+                      repr(e))
+                with self.condition:
+                    # Keep the values, newer submitted ones take precedence.
+                    # Central rotates the refresh token, losing it would
+                    # require a new authorization.
+                    self.pending = {**values, **(self.pending or {})}
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+            if failed:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            else:
+                delay = self.retry_delay
+
+    def write(self, values: typing.Dict):
+        # Load the old data from file
+        with open(self.credential_file, 'r') as f:
+            cred_data = json.load(f)
+        # Overwrite the changed values
+        cred_data.update(values)
+
+        # Write to a temp file next to the credential file and swap it in
+        directory = os.path.dirname(os.path.abspath(self.credential_file))
+        fd, temp_file = tempfile.mkstemp(dir=directory,
+                                         prefix='.credential-',
+                                         suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cred_data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.credential_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        print('Credentials saved. Expires In', cred_data.get('expires_in'),
+              'Created At', cred_data.get('created_at'))
@@ -7,7 +7,7 @@ from pyfiglet import figlet_format
 class CommunicationHandler():
 
     def __init__(self) -> None:
-        pass
+        self.last_status: typing.Union[str, None] = None  # Last printed status
 
     async def print_clear(self):
         print('\n' * 10)
@@ -15,6 +15,7 @@ class CommunicationHandler():
     async def print_status(self, message,
                            color: typing.Literal['red', 'green', 'orange',
                                                  'grey']):
+        self.last_status = message
         print(figlet_format(message, font='banner'))
 
     async def print_log(self, message=None):
@@ -4,12 +4,18 @@ import typing
 from aiohttp import web, web_ws
 
 from Communication.CommunicationHandler import CommunicationHandler
+from Metrics.Metrics import registry
+
+send_duration = registry.histogram(
+    'websocket_send_duration_seconds',
+    'Seconds to send a frame to a scan station by frame type', ('type', ))
 
 
 class WebsocketCommunicationHandler(CommunicationHandler):
 
     def __init__(self, websocket: web.WebSocketResponse) -> None:
         self.websocket = websocket
+        self.last_status: typing.Union[str, None] = None  # Last sent status
 
     async def print_clear(self):
         await self.send_clear()
@@ -17,6 +23,7 @@ class WebsocketCommunicationHandler(CommunicationHandler):
     async def print_status(self, message,
                            color: typing.Literal['red', 'green', 'orange',
                                                  'grey']):
+        self.last_status = message
         await self.send_status(status=message, color=color)
         self.print('Status', message)
 
@@ -48,28 +55,23 @@ class WebsocketCommunicationHandler(CommunicationHandler):
         }
         # if additional_data is typing.Mapping:
         #     data = {**data, **additional_data}  # type: ignore
-        return await self.websocket.send_json(data)
+        return await self.send(data)
 
     async def send_log(self, message):
-        return await self.websocket.send_json({
-            'type': 'log',
-            'value': message
-        })
+        return await self.send({'type': 'log', 'value': message})
 
     async def send_serial(self, serial):
-        return await self.websocket.send_json({
-            'type': 'serial',
-            'value': serial
-        })
+        return await self.send({'type': 'serial', 'value': serial})
 
     async def send_clear(self):
-        return await self.websocket.send_json({'type': 'clear'})
+        return await self.send({'type': 'clear'})
 
     async def send_excel(self, filename: str):
-        return await self.websocket.send_json({
-            'type': 'excel',
-            'value': filename
-        })
+        return await self.send({'type': 'excel', 'value': filename})
+
+    async def send(self, data: typing.Dict):
+        with send_duration.time(type=data['type']):
+            return await self.websocket.send_json(data)
 
     def print(self, type: typing.Literal['Log', 'Status', 'Serial'], message):
         WebsocketCommunicationHandler.format_address(
@@ -1,14 +1,32 @@
+import time
 import typing
 from typing import List, Literal, Tuple, cast
 
-from CentralAPI.CentralAPI import CENTRAL_SERVICES, SKU_TYPE, Central
+from CentralAPI.CentralAPI import (CENTRAL_SERVICES, SKU_TYPE, Central,
+                                   DeviceDetails)
 from Communication.CommunicationHandler import CommunicationHandler
+from FleetSync.FleetDelta import FleetDelta, compute_delta
+from Helper.CachedLists import CachedLists
+from Metrics.Metrics import cache_devices, timed_refresh
 
 
-class CentralDecomission():
+class CentralDecomission(CachedLists):
 
-    def __init__(self, central_client: Central, device_type: SKU_TYPE) -> None:
+    # Fields which mark a cached device as changed during a refresh
+    SYNC_FIELDS = ('device_type', 'services')
+
+    CACHES = {'inventory': 'device_dict'}
+    REFRESH_KEY = 'refresh_devices'
+
+    def __init__(self,
+                 central_client: Central,
+                 device_type: SKU_TYPE,
+                 cache_ttl: float = 300) -> None:
+        super().__init__(cache_ttl=cache_ttl)
         self.device_dict = {}
+        # Load which failed part way: (started_at, offset, total, devices)
+        self.partial_load: typing.Union[typing.Tuple[
+            float, int, typing.Union[int, None], dict], None] = None
 
         self.central_client = central_client
 
@@ -19,25 +37,40 @@ class CentralDecomission():
 
     def devices_to_dict(self, devices_dict: dict, devices):
         for device in devices:
-            devices_dict[device['serial']] = device
+            devices_dict[device['serial']] = \
+                DeviceDetails.from_central(device)
 
         return devices_dict
 
     async def get_devices(self):
         """
         Pagination aware loading of devices to a dictionary
+
+        If a page fails the next call resumes from that page as long as the
+        pages loaded so far are younger than `self.cache_ttl`.
         """
         step = 1000
+        started_at = time.time()
         offset = 0
         total = None
 
         devices_dict = {}
 
+        if self.partial_load and \
+                time.time() - self.partial_load[0] < self.cache_ttl:
+            started_at, offset, total, devices_dict = self.partial_load
+            print(f'Resuming inventory load at offset {offset}')
+        self.partial_load = None
+
         while total == None or (offset < total and len(devices_dict) < total):
-            devices_c = await self.central_client.get_devices_from_inventory(
-                sku_type=self.device_type,  # type: ignore
-                limit=step,
-                offset=offset)
+            try:
+                devices_c = await self.central_client.get_devices_from_inventory(
+                    sku_type=self.device_type,  # type: ignore
+                    limit=step,
+                    offset=offset)
+            except Exception:
+                self.partial_load = (started_at, offset, total, devices_dict)
+                raise
 
             offset = offset + step
             total = devices_c['total']
@@ -47,15 +80,38 @@ class CentralDecomission():
 
         return devices_dict
 
-    async def refresh_devices(self, *,
-                              comm_handler: typing.Union[CommunicationHandler,
-                                                         None]):
+    async def refresh_devices(
+        self, *, comm_handler: typing.Union[CommunicationHandler, None]
+    ) -> typing.Dict[str, FleetDelta]:
         """
-        Refresh local devices list in `self.devices_dict` from central
+        Refresh local devices list in `self.devices_dict` from central.
+
+        Concurrent callers join the refresh that is already in flight.
+
+        Returns the applied delta.
         """
         if comm_handler:
             await comm_handler.print_log('Refreshing devices list')
-        self.device_dict = await self.get_devices()
+        return await self.single_flight.do(self.REFRESH_KEY,
+                                           self.load_devices)
+
+    async def refresh(
+        self, *, comm_handler: typing.Union[CommunicationHandler, None]
+    ) -> typing.Dict[str, FleetDelta]:
+        """
+        Same as `refresh_devices`
+        """
+        return await self.refresh_devices(comm_handler=comm_handler)
+
+    async def load_devices(self) -> typing.Dict[str, FleetDelta]:
+        with timed_refresh('inventory'):
+            devices = await self.get_devices()
+        delta = compute_delta(self.device_dict, devices, self.SYNC_FIELDS)
+        self.apply_deltas({'inventory': delta})
+        self.refreshed_at = time.time()
+        cache_devices.set(len(self.device_dict), cache='inventory')
+
+        return {'inventory': delta}
 
     async def is_device_in_central(self, *, comm_handler: CommunicationHandler,
                                    serial: str):
@@ -73,9 +129,9 @@ class CentralDecomission():
                               serial: str) -> typing.Union[str, None]:
         if serial not in self.device_dict.keys():
             return None
-        if 'device_type' not in self.device_dict[serial].keys():
+        device_type = self.device_dict[serial].device_type
+        if device_type is None:
             return None
-        device_type = self.device_dict[serial]['device_type']
         await comm_handler.print_log(
             _('{serial} is {device_type}').format(serial=serial, device_type=device_type))
         return device_type
@@ -93,7 +149,7 @@ class CentralDecomission():
         if device_type.upper() == 'GATEWAY':
             await comm_handler.print_log(
                 _('{serial} - Delete Gateway').format(serial=serial))
-            success = self.central_client.delete_gateway(serial)
+            success = await self.central_client.delete_gateway(serial)
             #, proxies="http://localhost:8080", verify=None)
             await comm_handler.print_log(
                 _('{serial} - Deleted Gateway').format(serial=serial))
@@ -127,9 +183,9 @@ class CentralDecomission():
             serial: str) -> typing.Union[typing.List[CENTRAL_SERVICES], None]:
         if serial not in self.device_dict.keys():
             return None
-        if 'services' not in self.device_dict[serial].keys():
+        if self.device_dict[serial].services is None:
             return None
-        device_services = self.device_dict[serial]['services']
+        device_services = list(self.device_dict[serial].services)
         await comm_handler.print_log(
             _('{serial} has those services: {device_services}').format(
                 serial=serial, device_services=device_services))
@@ -148,7 +204,7 @@ class CentralDecomission():
         if not services:
             return False, {'error': 'No Subscriotions found'}
 
-        out = self.central_client.unassign_subscription_device(
+        out = await self.central_client.unassign_subscription_device(
             {
                 'serials': [serial],
                 'services': services
@@ -7,6 +7,7 @@ import typing
 from aiohttp import web
 from Communication.CommunicationHandler import CommunicationHandler
 from Helper.ArubaSerial import validate_sn
+from Metrics.Metrics import timed_scan
 
 from Decomission.CentralDecomission import CentralDecomission
 from Decomission.DecomissionExcelHandler import DecomissionExcelHandler
@@ -28,6 +29,7 @@ class DecomissionHandler():
     class OptionsDict(TypedDict):
         unlicense: bool
 
+    @timed_scan('decomission')
     async def handle_input(self, serial: str, options: OptionsDict):
 
         serial = serial.upper()
@@ -109,13 +111,13 @@ class DecomissionHandler():
             await self.comm_handler.print_status(message=_('Unsubscribed'),
                                                  color='green')
             if self.excel_handler:
-                self.excel_handler.update_status(
+                await self.excel_handler.update_status(
                     serial=serial, state={'unsubscribed_on': datetime.now()})
         else:
             await self.comm_handler.print_status(
                 message=_('Subscription Error'), color='red')
             if self.excel_handler:
-                self.excel_handler.update_status(
+                await self.excel_handler.update_status(
                     serial=serial, state={'unsubscribed_on': 'ERROR'})
 
     # State notification and logging handler
@@ -129,8 +131,8 @@ class DecomissionHandler():
         await self.comm_handler.print_status(message='In Central',
                                              color='orange')
         if self.excel_handler:
-            self.excel_handler.update_status(serial=serial,
-                                             state={'status': 'In Central'})
+            await self.excel_handler.update_status(serial=serial,
+                                                   state={'status': 'In Central'})
 
     async def notify_device_not_in_central(self, serial):
         """
@@ -141,7 +143,7 @@ class DecomissionHandler():
         await self.comm_handler.print_status(message=_('Not in Central'),
                                              color='red')
         if self.excel_handler:
-            self.excel_handler.update_status(
+            await self.excel_handler.update_status(
                 serial=serial, state={'status': 'Not in Central'})
 
     async def notify_device_deleted(self, serial):
@@ -153,7 +155,7 @@ class DecomissionHandler():
         await self.comm_handler.print_status(message=_('Deleted'),
                                              color='green')
         if self.excel_handler:
-            self.excel_handler.update_status(
+            await self.excel_handler.update_status(
                 serial=serial, state={'deleted_on': datetime.now()})
 
     async def notify_device_not_deleted(self, serial):
@@ -165,8 +167,8 @@ class DecomissionHandler():
         await self.comm_handler.print_status(message=_('Deletion aborted'),
                                              color='red')
         if self.excel_handler:
-            self.excel_handler.update_status(serial=serial,
-                                             state={'deleted_on': 'ERROR'})
+            await self.excel_handler.update_status(serial=serial,
+                                                   state={'deleted_on': 'ERROR'})
 
 
 async def redir_handler(request):
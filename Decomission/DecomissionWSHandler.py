@@ -10,6 +10,7 @@ from Communication.WebsocketCommunicationHandler import \
 from Decomission.CentralDecomission import CentralDecomission
 from Decomission.DecomissionExcelHandler import DecomissionExcelHandler
 from Decomission.DecomissionHandler import DecomissionHandler
+from Journal.ScanJournal import ScanJournal
 
 
 class DecomissionWSHandler():
@@ -18,11 +19,13 @@ class DecomissionWSHandler():
                  cen_dec: CentralDecomission,
                  excel_dir: typing.Union[str, None] = None,
                  download_url: typing.Union[str, None] = None,
-                 excel_persist: bool = False) -> None:
+                 excel_persist: bool = False,
+                 journal: typing.Union[ScanJournal, None] = None) -> None:
         self.cen_dec = cen_dec
         self.excel_dir = excel_dir
         self.download_url = download_url
         self.excel_persist = excel_persist
+        self.journal = journal
         pass
 
     async def websocket_handler(self, request):
@@ -45,32 +48,41 @@ class DecomissionWSHandler():
         comm_handler = WebsocketCommunicationHandler(websocket=ws)
         excel_handler = None
         if self.excel_dir:
-            excel_handler = DecomissionExcelHandler(self.excel_dir)
+            excel_handler = DecomissionExcelHandler(self.excel_dir,
+                                                    uuid=id,
+                                                    journal=self.journal)
             session_parameters['excel_dir'] = '/out'
             session_parameters['excel_filename'] = excel_handler.get_filename()
+        elif self.journal:
+            # No excel log, only record the scans in the journal
+            excel_handler = DecomissionExcelHandler(None,
+                                                    uuid=id,
+                                                    journal=self.journal)
 
         client_handler = DecomissionHandler(self.cen_dec,
                                             comm_handler=comm_handler,
                                             excel_handler=excel_handler)
 
-        async for msg in ws:
-            print('DEC', msg)
-            if msg.type == web_ws.WSMsgType.TEXT:
-                # print(msg.data)
-                if msg.data == 'close':
-                    await ws.close()
-                else:
-                    await handle_fw_websocket(
-                        websocket=ws,
-                        message=msg.data,
-                        client_handler=client_handler,
-                        comm_handler=comm_handler,
-                        session_parameters=session_parameters)
-
-        if excel_handler:
-            excel_handler.close()
-            if self.excel_persist:
-                excel_handler.delete()
+        try:
+            async for msg in ws:
+                print('DEC', msg)
+                if msg.type == web_ws.WSMsgType.TEXT:
+                    # print(msg.data)
+                    if msg.data == 'close':
+                        await ws.close()
+                    else:
+                        await handle_fw_websocket(
+                            websocket=ws,
+                            message=msg.data,
+                            client_handler=client_handler,
+                            comm_handler=comm_handler,
+                            session_parameters=session_parameters)
+        finally:
+            # Also save the session when a scan failed, f.e. Central is down
+            if excel_handler:
+                await excel_handler.close()
+                if self.excel_persist:
+                    await excel_handler.delete()
         print(f'{id} Websocket connection closed')
         return ws
 
@@ -94,7 +106,7 @@ async def handle_fw_websocket(websocket: web.WebSocketResponse, message: str,
     elif message_parsed['type'] == 'status':
         if message_parsed['value'] == 'connected':
             await comm_handler.print_clear()
-            await client_handler.cen_dec.refresh_devices(
+            await client_handler.cen_dec.refresh_if_stale(
                 comm_handler=comm_handler)
             print(
                 f"{session_parameters['id']} connected from {WebsocketCommunicationHandler.format_address(session_parameters['remote_address'])}"
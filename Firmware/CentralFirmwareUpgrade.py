@@ -1,76 +1,118 @@
+import asyncio
+import time
 from typing import Dict
 import typing
 
-from CentralAPI.CentralAPI import Central, DeviceDetailsSkeleton
+from CentralAPI.CentralAPI import Central, DeviceDetails
+from CentralAPI.CentralRateLimiter import background_priority
 from Communication.CommunicationHandler import CommunicationHandler
+from Firmware.DeviceIndex import DeviceIndex
+from FleetSync.FleetDelta import FleetDelta, compute_delta
+from Helper.CachedLists import CachedLists
+from Helper.Pagination import fetch_all_pages
+from Metrics.Metrics import cache_devices, timed_refresh
 
 
-class CentralFirmwareUpgrade:
+class CentralFirmwareUpgrade(CachedLists):
+
+    # Fields which mark a cached device as changed during a refresh
+    SYNC_FIELDS = ('group_name', 'firmware_version', 'status', 'switch_type')
+
+    CACHES = {
+        'gateways': 'gateway_dict',
+        'switches': 'switch_dict',
+        'aps': 'ap_dict'
+    }
+    REFRESH_KEY = 'refresh_all'
 
     def __init__(self,
                  central_client: Central,
                  group,
-                 target_firmware: typing.Union[str, None] = None):
+                 target_firmware: typing.Union[str, None] = None,
+                 page_size: int = 1000,
+                 max_in_flight_pages: int = 4,
+                 cache_ttl: float = 300):
         self.gateway_dict = {}  # List with all gateways and state
         self.switch_dict = {}  # List with all switches and state
         self.ap_dict = {}  # List with all aps and state
+        self.index = DeviceIndex()  # Serial index over all three lists
 
         self.central_client = central_client  # Central API Provider
         self.group = group  # Selected group
-        self.target_firmware_gateway = target_firmware  # Firmware to which the devices should be upgraded
-        self.target_firmware_cx = None
-        self.target_firmware_ap = None
-        self.target_firmware_hp = None
-
-        if self.target_firmware_gateway is None:
-            # No firmware override provided by CLI - Loading from central
-            self.target_firmware_gateway = \
-                self.get_firmware_compliance_version('CONTROLLER')
-
-        if self.target_firmware_cx is None:
-            # No firmware override provided by CLI - Loading from central
-            self.target_firmware_cx = \
-                self.get_firmware_compliance_version('CX')
-
-        if self.target_firmware_ap is None:
-            self.target_firmware_ap = \
-                self.get_firmware_compliance_version('IAP')
-
-        if self.target_firmware_hp is None:
-            self.target_firmware_hp = \
-                self.get_firmware_compliance_version('HP')
-
-    def get_device(self, serial) -> typing.Union[DeviceDetailsSkeleton, None]:
-        if serial in self.gateway_dict:
-            return self.gateway_dict[serial]
-        if serial in self.switch_dict:
-            return self.switch_dict[serial]
-        if serial in self.ap_dict:
-            return self.ap_dict[serial]
-        return None
-
-    def get_firmware_compliance_version(
+        self.page_size = page_size  # Devices requested per page
+        self.max_in_flight_pages = max_in_flight_pages  # Concurrent page requests
+        super().__init__(cache_ttl=cache_ttl)
+        # Firmware to which the devices should be upgraded, if set by the CLI
+        self.firmware_overrides: typing.Dict[str, typing.Union[str, None]] = {
+            'CONTROLLER': target_firmware
+        }
+        # Compliance versions loaded from central per (group, device_type)
+        self.compliance_versions: typing.Dict[typing.Tuple[str, str],
+                                              typing.Union[str, None]] = {}
+
+    async def load_target_firmware(self):
+        """
+        Load the target firmware versions of all device types concurrently
+        """
+        await asyncio.gather(
+            *[self.get_target_firmware(device_type)
+              for device_type in ('CONTROLLER', 'CX', 'IAP', 'HP')])
+
+    async def preload_target_firmware(self):
+        """
+        Load the target firmware versions in the background. Failures are
+        reported and retried on first use.
+        """
+        try:
+            with background_priority():
+                await self.load_target_firmware()
+        except Exception as e:
+            print(
+                _('Could not load target firmware: {error!r}').format(error=e))
+
+    def get_device(self, serial) -> typing.Union[DeviceDetails, None]:
+        entry = self.index.get(serial)
+        if entry is None:
+            return None
+        return entry[0]
+
+    async def get_firmware_compliance_version(
             self, device_type: Central.FIRMWARE_DEVICE_TYPE) -> str:
-        fw_report = self.central_client.get_firmware_compliance(
+        """
+        Returns the compliance version of `self.group` for `device_type`.
+        Loaded from central once and cached afterwards.
+        """
+        key = (self.group, device_type)
+        if key not in self.compliance_versions:
+            self.compliance_versions[key] = await self.single_flight.do(
+                ('compliance', ) + key,
+                lambda: self.load_firmware_compliance_version(device_type))
+        return self.compliance_versions[key]  # type: ignore
+
+    async def load_firmware_compliance_version(
+            self, device_type: Central.FIRMWARE_DEVICE_TYPE) -> str:
+        fw_report = await self.central_client.get_firmware_compliance(
             self.group, device_type)
         return fw_report[
             'firmware_compliance_version']  # f.e. '8.7.0.0-2.3.0.8_84688'
 
     def gateways_to_dict(self, gateway_dict: Dict, gateways):
         for gateway in gateways:
-            gateway_dict[gateway['serial']] = gateway
+            gateway_dict[gateway['serial']] = \
+                DeviceDetails.from_central(gateway)
 
         return gateway_dict
 
     def switches_to_dict(self, switch_dict: Dict, switches):
         for switch in switches:
-            switch_dict[switch['serial']] = switch
+            switch_dict[switch['serial']] = \
+                DeviceDetails.from_central(switch)
 
         return switch_dict
 
     def aps_to_dict(self, ap_dict: Dict, aps):
         for ap in aps:
-            ap_dict[ap['serial']] = ap
+            ap_dict[ap['serial']] = DeviceDetails.from_central(ap)
 
         return ap_dict
 
@@ -78,63 +120,40 @@ class CentralFirmwareUpgrade:
         """
         Pagination aware loading of gateways to a dictionary
         """
-        step = 1000
-        offset = 0
-
-        gateway_dict = {}
-
-        while True:
-            gateways_c = await self.central_client.get_gateways(
-                limit=step, offset=offset, calculate_total=False)
-
-            if not len(gateways_c['gateways']):
-                return gateway_dict
-
-            gateway_dict = self.gateways_to_dict(gateway_dict,
-                                                 gateways_c['gateways'])
+        gateways = await fetch_all_pages(
+            lambda limit, offset: self.central_client.get_gateways(
+                limit=limit, offset=offset, calculate_total=True),
+            'gateways',
+            step=self.page_size,
+            max_in_flight=self.max_in_flight_pages)
 
-            offset = offset + step
+        return self.gateways_to_dict({}, gateways)
 
     async def get_switches(self):
         """
         Pagination aware loading of switches to a dictionary
         """
-        step = 1000
-        offset = 0
+        switches = await fetch_all_pages(
+            lambda limit, offset: self.central_client.get_switches(
+                limit=limit, offset=offset, calculate_total=True),
+            'switches',
+            step=self.page_size,
+            max_in_flight=self.max_in_flight_pages)
 
-        switches_dict = {}
-
-        while True:
-            switches_c = await self.central_client.get_switches(limit=step,
-                                                                offset=offset)
-
-            if not len(switches_c['switches']):
-                return switches_dict
-
-            switches_dict = self.switches_to_dict(switches_dict,
-                                                  switches_c['switches'])
-
-            offset = offset + step
+        return self.switches_to_dict({}, switches)
 
     async def get_aps(self):
         """
-        Pagination aware loading of switches to a dictionary
+        Pagination aware loading of aps to a dictionary
         """
-        step = 1000
-        offset = 0
+        aps = await fetch_all_pages(
+            lambda limit, offset: self.central_client.get_aps(
+                limit=limit, offset=offset, calculate_total=True),
+            'aps',
+            step=self.page_size,
+            max_in_flight=self.max_in_flight_pages)
 
-        ap_dict = {}
-
-        while True:
-            aps_c = await self.central_client.get_aps(limit=step,
-                                                      offset=offset)
-
-            if not len(aps_c['aps']):
-                return ap_dict
-
-            ap_dict = self.aps_to_dict(ap_dict, aps_c['aps'])
-
-            offset = offset + step
+        return self.aps_to_dict({}, aps)
 
     async def refresh_gateways(self,
                                *,
@@ -145,7 +164,11 @@ class CentralFirmwareUpgrade:
         """
         if comm_handler:
             await comm_handler.print_log(_('Refreshing gateway list'))
-        self.gateway_dict = await self.get_gateways()
+        self.apply_deltas({
+            'gateways':
+            compute_delta(self.gateway_dict, await self.get_gateways(),
+                          self.SYNC_FIELDS)
+        })
 
     async def refresh_switches(self,
                                *,
@@ -156,7 +179,11 @@ class CentralFirmwareUpgrade:
         """
         if comm_handler:
             await comm_handler.print_log(_('Refreshing switch list'))
-        self.switch_dict = await self.get_switches()
+        self.apply_deltas({
+            'switches':
+            compute_delta(self.switch_dict, await self.get_switches(),
+                          self.SYNC_FIELDS)
+        })
 
     async def refresh_aps(self,
                           *,
@@ -167,36 +194,177 @@ class CentralFirmwareUpgrade:
         """
         if comm_handler:
             await comm_handler.print_log(_('Refreshing ap list'))
-        self.ap_dict = await self.get_aps()
+        self.apply_deltas({
+            'aps':
+            compute_delta(self.ap_dict, await self.get_aps(),
+                          self.SYNC_FIELDS)
+        })
+
+    async def refresh_all(
+        self,
+        *,
+        comm_handler: typing.Union[CommunicationHandler, None] = None
+    ) -> typing.Dict[str, FleetDelta]:
+        """
+        Refresh gateways, switches and aps concurrently from central.
+
+        The changes of all three lists are applied together once everything
+        is loaded, so a scan never sees a partially refreshed fleet.
+        Concurrent callers join the refresh that is already in flight.
+
+        Returns the applied delta per list.
+        """
+        if comm_handler:
+            await comm_handler.print_log(
+                _('Refreshing gateway, switch and ap list'))
+        return await self.single_flight.do(self.REFRESH_KEY, self.load_all)
+
+    async def refresh(
+        self,
+        *,
+        comm_handler: typing.Union[CommunicationHandler, None] = None
+    ) -> typing.Dict[str, FleetDelta]:
+        """
+        Same as `refresh_all`
+        """
+        return await self.refresh_all(comm_handler=comm_handler)
+
+    def apply_deltas(self, deltas: typing.Dict[str, FleetDelta]):
+        """
+        Apply per list deltas to the cached lists and keep `self.index` in
+        sync with them.
+        """
+        for delta in deltas.values():
+            for serial in delta.removed:
+                self.index.remove(serial)
+        super().apply_deltas(deltas)
+        for name, delta in deltas.items():
+            for device in [*delta.added.values(), *delta.changed.values()]:
+                self.index.put(device, self.family_device_type(name, device))
+
+    def family_device_type(
+            self, name: str,
+            device: DeviceDetails) -> Central.FIRMWARE_DEVICE_TYPE:
+        """
+        Returns the firmware device type of a device in the list `name`
+        """
+        if name == 'gateways':
+            return 'CONTROLLER'
+        elif name == 'switches':
+            if device.switch_type == 'AOS-S':
+                return 'HP'
+            else:
+                return 'CX'
+        return 'IAP'
+
+    async def load_all(self) -> typing.Dict[str, FleetDelta]:
+        with timed_refresh('fleet'):
+            gateway_dict, switch_dict, ap_dict = await asyncio.gather(
+                self.get_gateways(), self.get_switches(), self.get_aps())
+
+        deltas = {
+            'gateways':
+            compute_delta(self.gateway_dict, gateway_dict, self.SYNC_FIELDS),
+            'switches':
+            compute_delta(self.switch_dict, switch_dict, self.SYNC_FIELDS),
+            'aps': compute_delta(self.ap_dict, ap_dict, self.SYNC_FIELDS)
+        }
+        # No await from here on. Scans see either the old or the new fleet.
+        self.apply_deltas(deltas)
+        self.refreshed_at = time.time()
+
+        for name, devices in self.caches().items():
+            cache_devices.set(len(devices), cache=name)
+
+        return deltas
+
+    async def lookup_device(self, *, comm_handler: CommunicationHandler,
+                            serial: str):
+        """
+        Query central for a single device and merge the result into
+        `self.gateway_dict`, `self.switch_dict` and `self.ap_dict`.
+
+        Returns `true` if `serial` is known to central.
+        """
+        await comm_handler.print_log(
+            _('{serial} - Look up device in central').format(serial=serial))
+        gateway, switch, ap = await asyncio.gather(
+            self.central_client.get_gateway(serial),
+            self.central_client.get_switch(serial),
+            self.central_client.get_ap(serial))
+
+        self.apply_deltas({
+            'gateways': self.device_delta(self.gateway_dict, serial, gateway),
+            'switches': self.device_delta(self.switch_dict, serial, switch),
+            'aps': self.device_delta(self.ap_dict, serial, ap)
+        })
+
+        return gateway is not None or switch is not None or ap is not None
+
+    async def refresh_device(self, *, comm_handler: CommunicationHandler,
+                             serial: str):
+        """
+        Query central for a single device already in the local lists, only
+        asking the endpoint of its device family instead of all three.
+        Unknown devices are looked up with `lookup_device`.
+
+        Returns `true` if `serial` is still known to central.
+        """
+        device_type = self.get_device_type(serial=serial)
+        if device_type is None:
+            return await self.lookup_device(comm_handler=comm_handler,
+                                            serial=serial)
+        await comm_handler.print_log(
+            _('{serial} - Refresh device from central').format(serial=serial))
+        name, get_device, device_dict = {
+            'CONTROLLER':
+            ('gateways', self.central_client.get_gateway, self.gateway_dict),
+            'HP':
+            ('switches', self.central_client.get_switch, self.switch_dict),
+            'CX':
+            ('switches', self.central_client.get_switch, self.switch_dict),
+            'IAP': ('aps', self.central_client.get_ap, self.ap_dict)
+        }[device_type]
+        device = await get_device(serial)
+
+        self.apply_deltas({name: self.device_delta(device_dict, serial,
+                                                   device)})
+
+        return device is not None
+
+    def device_delta(self, device_dict: Dict, serial: str,
+                     device: typing.Union[Dict, None]) -> FleetDelta:
+        """
+        Delta storing `device` under `serial` or dropping the entry if central
+        no longer knows the device.
+        """
+        if device is None:
+            removed = [serial] if serial in device_dict else []
+            return FleetDelta(added={}, removed=removed, changed={})
+        record = DeviceDetails.from_central(device)
+        if serial in device_dict:
+            return FleetDelta(added={}, removed=[], changed={serial: record})
+        return FleetDelta(added={serial: record}, removed=[], changed={})
 
     async def is_device_in_central(self, *, comm_handler: CommunicationHandler,
                                    serial: str):
         """
-        Local check if device is in `self.gateway_dict`.
+        Local check if device is in `self.index`.
 
         Retruns `true` if `serial` found in central.
         """
         await comm_handler.print_log(
             _('{serial} - device in central?').format(serial=serial))
-        return \
-            serial in self.gateway_dict or \
-            serial in self.switch_dict or \
-            serial in self.ap_dict
+        return serial in self.index
 
     def get_device_type(self, *, serial: str):
         """
         Returns device type for device or None if not known
         """
-        if serial in self.gateway_dict:
-            return 'CONTROLLER'
-        elif serial in self.switch_dict:
-            if self.switch_dict[serial]['switch_type'] == 'AOS-S':
-                return 'HP'
-            else:
-                return 'CX'
-        elif serial in self.ap_dict:
-            return 'IAP'
-        return None
+        entry = self.index.get(serial)
+        if entry is None:
+            return None
+        return entry[1]
 
     async def is_device_in_group(self, *, comm_handler: CommunicationHandler,
                                  serial: str):
@@ -212,7 +380,7 @@ class CentralFirmwareUpgrade:
         if device is None:
             return None
         else:
-            return device['group_name'] == self.group
+            return device.group_name == self.group
 
     async def is_device_version_knwon(self, *,
                                       comm_handler: CommunicationHandler,
@@ -226,7 +394,7 @@ class CentralFirmwareUpgrade:
             _('{serial} - is firmware known?').format(serial=serial))
         device = self.get_device(serial=serial)
         if device is not None:
-            return not device['firmware_version'] == 'Unknown'
+            return not device.firmware_version == 'Unknown'
 
     async def is_device_online(self, *, comm_handler: CommunicationHandler,
                                serial: str):
@@ -239,7 +407,7 @@ class CentralFirmwareUpgrade:
             _('{serial} - online?').format(serial=serial))
         device = self.get_device(serial=serial)
         if device is not None:
-            return not device['status'] == 'Down'
+            return not device.status == 'Down'
 
     async def move_device_to_group(self, *, comm_handler: CommunicationHandler,
                                    serial: str):
@@ -272,56 +440,58 @@ class CentralFirmwareUpgrade:
             _('{serial} - get fw version local').format(serial=serial))
         device = self.get_device(serial=serial)
         if device is not None:
-            return device['firmware_version']
+            return device.firmware_version
+
+    async def get_target_firmware(self, device_type: typing.Union[str,
+                                                                  None]):
+        """
+        Returns the target firmware for a device type as returned by
+        `get_device_type` or None if not known
+        """
+        if device_type not in ('CONTROLLER', 'HP', 'CX', 'IAP'):
+            return None
+        if self.firmware_overrides.get(device_type) is not None:
+            # Firmware override provided by CLI
+            return self.firmware_overrides[device_type]
+        return await self.get_firmware_compliance_version(
+            device_type)  # type: ignore
 
     async def check_device_firmware(self, *,
                                     comm_handler: CommunicationHandler,
                                     serial: str):
         """
-        Check if device firmware in `self.gateway_dict` matches
-        the `self.target_firmware`.
-        Reloads `self.gateway_dict` from central if version doesn't match.
+        Check if device firmware in the local lists matches the target
+        firmware for its device type.
+        Looks up the device in central again if the version doesn't match.
 
         Returns `true` if the device has the correct firmware version.
         """
         await comm_handler.print_log(
             _('{serial} - Check fw version').format(serial=serial))
 
-        device_type = self.get_device_type(serial=serial)
-        firmware = await self.get_device_firmware(comm_handler=comm_handler,
-                                                  serial=serial)
-
-        if device_type == 'CONTROLLER' and \
-                self.target_firmware_gateway == firmware:
-            return True
-        elif device_type == 'HP' and \
-                self.target_firmware_hp == firmware:
-            return True
-        elif device_type == 'CX' and \
-                self.target_firmware_cx == firmware:
-            return True
-        elif device_type == 'AP' and \
-                self.target_firmware_ap == firmware:
+        if await self.is_device_on_target_firmware(comm_handler=comm_handler,
+                                                   serial=serial):
             return True
 
-        # Not currently up to date -> refreshing from central
-        await self.refresh_gateways(comm_handler=comm_handler)
-        await self.refresh_switches(comm_handler=comm_handler)
-        await self.refresh_aps(comm_handler=comm_handler)
+        # Not currently up to date -> fetch this device from central
+        await self.refresh_device(comm_handler=comm_handler, serial=serial)
 
         await comm_handler.print_log(
             _('{serial} - Check fw version again!').format(serial=serial))
-        if device_type == 'CONTROLLER':
-            return self.target_firmware_gateway == firmware
-        elif device_type == 'HP':
-            return self.target_firmware_hp == firmware
-
-        elif device_type == 'CX':
-            return self.target_firmware_cx == firmware
+        return await self.is_device_on_target_firmware(
+            comm_handler=comm_handler, serial=serial)
 
-        elif device_type == 'AP':
-            return self.target_firmware_ap == firmware
-        return False
+    async def is_device_on_target_firmware(
+            self, *, comm_handler: CommunicationHandler, serial: str):
+        """
+        Local check if the cached device firmware matches the target firmware.
+        """
+        device_type = self.get_device_type(serial=serial)
+        if device_type is None:
+            return False
+        firmware = await self.get_device_firmware(comm_handler=comm_handler,
+                                                  serial=serial)
+        return await self.get_target_firmware(device_type) == firmware
 
     async def escalate_firmware_status(self, *,
                                        comm_handler: CommunicationHandler,
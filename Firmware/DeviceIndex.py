@@ -0,0 +1,58 @@
+import collections
+import typing
+
+from CentralAPI.CentralAPI import Central, DeviceDetails
+
+
+class DeviceIndex():
+    """
+    Serial index over gateways, switches and aps.
+
+    Maps every serial to its record and firmware device type (CONTROLLER, HP,
+    CX, IAP), so a scan needs a single hash lookup. Also keeps the number of
+    devices per device type and per group.
+    """
+
+    def __init__(self) -> None:
+        self.entries: typing.Dict[str, typing.Tuple[
+            DeviceDetails, Central.FIRMWARE_DEVICE_TYPE]] = {}
+        self.family_counts: typing.Counter[str] = collections.Counter()
+        self.group_counts: typing.Counter[str] = collections.Counter()
+
+    def __contains__(self, serial) -> bool:
+        return serial in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(
+        self, serial: str
+    ) -> typing.Union[typing.Tuple[DeviceDetails, Central.FIRMWARE_DEVICE_TYPE],
+                      None]:
+        return self.entries.get(serial)
+
+    def put(self, device: DeviceDetails,
+            device_type: Central.FIRMWARE_DEVICE_TYPE):
+        self.remove(device.serial)
+        self.entries[device.serial] = (device, device_type)
+        self.family_counts[device_type] += 1
+        self.group_counts[device.group_name or ''] += 1
+
+    def remove(self, serial: str):
+        entry = self.entries.pop(serial, None)
+        if entry is None:
+            return
+        device, device_type = entry
+        self.family_counts[device_type] -= 1
+        if not self.family_counts[device_type]:
+            del self.family_counts[device_type]
+        group_name = device.group_name or ''
+        self.group_counts[group_name] -= 1
+        if not self.group_counts[group_name]:
+            del self.group_counts[group_name]
+
+    def counts_by_family(self) -> typing.Dict[str, int]:
+        return dict(self.family_counts)
+
+    def counts_by_group(self) -> typing.Dict[str, int]:
+        return dict(self.group_counts)
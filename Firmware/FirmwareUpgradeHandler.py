@@ -5,6 +5,7 @@ import typing
 from aiohttp import web, web_ws
 from Communication.CommunicationHandler import CommunicationHandler
 from Helper.ArubaSerial import validate_sn
+from Metrics.Metrics import timed_scan
 
 from Firmware.CentralFirmwareUpgrade import CentralFirmwareUpgrade
 from Firmware.FirmwareExcelHandler import FirmwareExcelHandler
@@ -23,6 +24,7 @@ class FirmwareUpgradeHandler():
         self.excel_handler = excel_handler
         self.last_serial = ''
 
+    @timed_scan('firmware')
     async def handle_input(self, serial: str):
 
         serial = serial.upper()
@@ -53,13 +55,9 @@ class FirmwareUpgradeHandler():
                 _('{serial} is in Central').format(serial=serial))
         elif escalate:
             # Device not found locally. BUT force escalation
-            # Refresh gateway list
-            await self.cfu.refresh_gateways(comm_handler=self.comm_handler)
-            await self.cfu.refresh_switches(comm_handler=self.comm_handler)
-            await self.cfu.refresh_aps(comm_handler=self.comm_handler)
-            # Check again if device is in central
-            if await self.cfu.is_device_in_central(
-                    comm_handler=self.comm_handler, serial=serial):
+            # Ask central for this device only
+            if await self.cfu.lookup_device(comm_handler=self.comm_handler,
+                                            serial=serial):
                 # Device found in central continue
                 await self.comm_handler.print_log(
                     _('{serial} is in Central').format(serial=serial))
@@ -71,8 +69,8 @@ class FirmwareUpgradeHandler():
 
                 await self.comm_handler.print_log()
                 if self.excel_handler:
-                    self.excel_handler.update_status(serial=serial,
-                                                     status='Not in central')
+                    await self.excel_handler.update_status(serial=serial,
+                                                           status='Not in central')
                 await self.comm_handler.print_status(_('Not in Central'),
                                                      color='orange')
                 return  # ABORT
@@ -85,8 +83,8 @@ class FirmwareUpgradeHandler():
 
             await self.comm_handler.print_log()
             if self.excel_handler:
-                self.excel_handler.update_status(serial=serial,
-                                                 status='Not in central')
+                await self.excel_handler.update_status(serial=serial,
+                                                       status='Not in central')
             await self.comm_handler.print_status(_('Not in Central'),
                                                  color='orange')
             return  # ABORT
@@ -134,8 +132,8 @@ class FirmwareUpgradeHandler():
 
             await self.comm_handler.print_log()
             if self.excel_handler:
-                self.excel_handler.update_status(serial=serial,
-                                                 status='Moving')
+                await self.excel_handler.update_status(serial=serial,
+                                                       status='Moving')
             await self.comm_handler.print_status('Moving', color='grey')
 
             # Move gateway to desired group
@@ -146,11 +144,10 @@ class FirmwareUpgradeHandler():
             await self.comm_handler.print_log('Sleep')
             await asyncio.sleep(2)
 
-            # Now refresh the gateway list.
+            # Now look up the device again.
             # So that we can see the device with hopefully the correct group
-            await self.cfu.refresh_gateways(comm_handler=self.comm_handler)
-            await self.cfu.refresh_switches(comm_handler=self.comm_handler)
-            await self.cfu.refresh_aps(comm_handler=self.comm_handler)
+            await self.cfu.refresh_device(comm_handler=self.comm_handler,
+                                          serial=serial)
             return  # ABORT for now
 
         # Device is in Central. DONE
@@ -165,7 +162,7 @@ class FirmwareUpgradeHandler():
             await self.comm_handler.print_log()
             if self.excel_handler:
                 # Save current firmware to excel
-                self.excel_handler.update_status(
+                await self.excel_handler.update_status(
                     serial=serial,
                     status=await self.cfu.get_device_firmware(
                         comm_handler=self.comm_handler, serial=serial))
@@ -183,7 +180,7 @@ class FirmwareUpgradeHandler():
             await self.comm_handler.print_log()
             if self.excel_handler:
                 # Save current firmware to excel
-                self.excel_handler.update_status(
+                await self.excel_handler.update_status(
                     serial=serial,
                     status=await self.cfu.get_device_firmware(
                         comm_handler=self.comm_handler, serial=serial))
@@ -10,6 +10,7 @@ from Communication.WebsocketCommunicationHandler import \
 from Firmware.CentralFirmwareUpgrade import CentralFirmwareUpgrade
 from Firmware.FirmwareExcelHandler import FirmwareExcelHandler
 from Firmware.FirmwareUpgradeHandler import FirmwareUpgradeHandler
+from Journal.ScanJournal import ScanJournal
 
 
 class FirmwareWSHandler():
@@ -18,11 +19,13 @@ class FirmwareWSHandler():
                  cfu: CentralFirmwareUpgrade,
                  excel_dir: typing.Union[str, None] = None,
                  download_url: typing.Union[str, None] = None,
-                 excel_persist: bool = False) -> None:
+                 excel_persist: bool = False,
+                 journal: typing.Union[ScanJournal, None] = None) -> None:
         self.cfu = cfu
         self.excel_dir = excel_dir
         self.download_url = download_url
         self.excel_persist = excel_persist
+        self.journal = journal
         pass
 
     async def websocket_handler(self, request):
@@ -45,32 +48,41 @@ class FirmwareWSHandler():
         comm_handler = WebsocketCommunicationHandler(websocket=ws)
         excel_handler = None
         if self.excel_dir:
-            excel_handler = FirmwareExcelHandler(self.excel_dir)
+            excel_handler = FirmwareExcelHandler(self.excel_dir,
+                                                 uuid=id,
+                                                 journal=self.journal)
             session_parameters['excel_dir'] = '/out'
             session_parameters['excel_filename'] = excel_handler.get_filename()
+        elif self.journal:
+            # No excel log, only record the scans in the journal
+            excel_handler = FirmwareExcelHandler(None,
+                                                 uuid=id,
+                                                 journal=self.journal)
 
         client_handler = FirmwareUpgradeHandler(self.cfu,
                                                 comm_handler=comm_handler,
                                                 excel_handler=excel_handler)
 
-        async for msg in ws:
-            # print(msg)
-            if msg.type == web_ws.WSMsgType.TEXT:
-                # print(msg.data)
-                if msg.data == 'close':
-                    await ws.close()
-                else:
-                    await handle_fw_websocket(
-                        websocket=ws,
-                        message=msg.data,
-                        client_handler=client_handler,
-                        comm_handler=comm_handler,
-                        session_parameters=session_parameters)
-
-        if excel_handler:
-            excel_handler.close()
-            if self.excel_persist:
-                excel_handler.delete()
+        try:
+            async for msg in ws:
+                # print(msg)
+                if msg.type == web_ws.WSMsgType.TEXT:
+                    # print(msg.data)
+                    if msg.data == 'close':
+                        await ws.close()
+                    else:
+                        await handle_fw_websocket(
+                            websocket=ws,
+                            message=msg.data,
+                            client_handler=client_handler,
+                            comm_handler=comm_handler,
+                            session_parameters=session_parameters)
+        finally:
+            # Also save the session when a scan failed, f.e. Central is down
+            if excel_handler:
+                await excel_handler.close()
+                if self.excel_persist:
+                    await excel_handler.delete()
         print(f'{id} Websocket connection closed')
         return ws
 
@@ -90,11 +102,8 @@ async def handle_fw_websocket(websocket: web.WebSocketResponse, message: str,
     elif message['type'] == 'status':  # type: ignore
         if message['value'] == 'connected':  # type: ignore
             await comm_handler.print_clear()
-            await client_handler.cfu.refresh_gateways(comm_handler=comm_handler
-                                                      )
-            await client_handler.cfu.refresh_switches(comm_handler=comm_handler
-                                                      )
-            await client_handler.cfu.refresh_aps(comm_handler=comm_handler)
+            await client_handler.cfu.refresh_if_stale(
+                comm_handler=comm_handler)
             print(
                 f"{session_parameters['id']} connected from {WebsocketCommunicationHandler.format_address(session_parameters['remote_address'])}"
             )
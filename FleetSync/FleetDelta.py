@@ -0,0 +1,53 @@
+import typing
+
+
+class FleetDelta(typing.NamedTuple):
+    added: typing.Dict[str, typing.Any]
+    removed: typing.List[str]
+    changed: typing.Dict[str, typing.Any]
+
+    def counts(self) -> typing.Dict[str, int]:
+        return {
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'changed': len(self.changed)
+        }
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def summary(self) -> str:
+        return f'+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}'
+
+
+def compute_delta(current: typing.Dict, loaded: typing.Dict,
+                  fields: typing.Iterable[str]) -> FleetDelta:
+    """
+    Per serial difference between the cached `current` dict and a freshly
+    `loaded` one. A device counts as changed if one of `fields` differs.
+    """
+    fields = tuple(fields)
+    added = {}
+    changed = {}
+    for serial, device in loaded.items():
+        cached = current.get(serial)
+        if cached is None:
+            added[serial] = device
+        elif any(
+                getattr(cached, field) != getattr(device, field)
+                for field in fields):
+            changed[serial] = device
+
+    removed = [serial for serial in current if serial not in loaded]
+
+    return FleetDelta(added=added, removed=removed, changed=changed)
+
+
+def apply_delta(current: typing.Dict, delta: FleetDelta):
+    """
+    Apply `delta` to `current` in place.
+    """
+    for serial in delta.removed:
+        current.pop(serial, None)
+    current.update(delta.added)
+    current.update(delta.changed)
@@ -0,0 +1,92 @@
+import json
+import os.path
+import sqlite3
+import typing
+
+from CentralAPI.CentralAPI import DeviceDetails
+
+Caches = typing.Dict[str, typing.Dict[str, DeviceDetails]]
+# Time each cache was loaded from central, None if it never was
+RefreshTimes = typing.Dict[str, typing.Union[float, None]]
+
+
+class FleetSnapshot():
+    """
+    On-disk copy of the device caches stored in a local SQLite file.
+
+    Allows the tool to serve scans right after a restart while the caches are
+    revalidated against central in the background.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename)
+        connection.execute('CREATE TABLE IF NOT EXISTS meta ('
+                           'key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE IF NOT EXISTS devices ('
+                           'cache TEXT, serial TEXT, data TEXT, '
+                           'PRIMARY KEY (cache, serial))')
+        return connection
+
+    def save(self,
+             caches: Caches,
+             refreshed_at: RefreshTimes,
+             changed: typing.Union[typing.Iterable[str], None] = None):
+        """
+        Store `caches` with the time each of them was loaded from central in
+        a single transaction. Only the caches named in `changed` are
+        rewritten, all of them if it is None.
+        """
+        names = list(caches) if changed is None else [
+            name for name in changed if name in caches
+        ]
+
+        connection = self.connect()
+        try:
+            with connection:
+                for name in names:
+                    connection.execute('DELETE FROM devices WHERE cache = ?',
+                                       (name, ))
+                    connection.executemany(
+                        'INSERT INTO devices VALUES (?, ?, ?)',
+                        ((name, serial,
+                          json.dumps(device.to_dict(),
+                                     separators=(',', ':')))
+                         for serial, device in caches[name].items()))
+                for name, loaded_at in refreshed_at.items():
+                    connection.execute(
+                        'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                        (f'refreshed_at:{name}', repr(loaded_at)))
+        finally:
+            connection.close()
+
+    def load(self) -> typing.Union[typing.Tuple[Caches, RefreshTimes], None]:
+        """
+        Returns the stored caches and the time each of them was loaded from
+        central (None if unknown) or None if there is no snapshot.
+        """
+        if not os.path.isfile(self.filename):
+            return None
+
+        connection = self.connect()
+        try:
+            refreshed_at: RefreshTimes = {}
+            for key, value in connection.execute(
+                    'SELECT key, value FROM meta WHERE key LIKE ?',
+                ('refreshed_at:%', )):
+                refreshed_at[key.split(':', 1)[1]] = \
+                    None if value == 'None' else float(value)
+
+            caches: Caches = {}
+            for cache, serial, data in connection.execute(
+                    'SELECT cache, serial, data FROM devices'):
+                caches.setdefault(cache, {})[serial] = \
+                    DeviceDetails.from_central(json.loads(data))
+        finally:
+            connection.close()
+
+        if not caches:
+            return None
+        return caches, refreshed_at
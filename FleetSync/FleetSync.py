@@ -0,0 +1,157 @@
+import asyncio
+import time
+import typing
+
+from CentralAPI.CentralRateLimiter import background_priority
+from Decomission.CentralDecomission import CentralDecomission
+from Firmware.CentralFirmwareUpgrade import CentralFirmwareUpgrade
+from FleetSync.FleetDelta import FleetDelta
+from FleetSync.FleetSnapshot import FleetSnapshot
+
+
+class FleetSync():
+    """
+    Background task that periodically syncs the firmware fleet and the device
+    inventory, so that scans always hit a warm cache.
+
+    If a `snapshot` is given the caches are restored from it on startup and
+    written back after every cycle and on shutdown.
+    """
+
+    def __init__(self,
+                 cfu: CentralFirmwareUpgrade,
+                 cen_dec: CentralDecomission,
+                 interval: float = 1800,
+                 snapshot: typing.Union[FleetSnapshot, None] = None) -> None:
+        self.cfu = cfu
+        self.cen_dec = cen_dec
+        self.interval = interval  # Seconds between two sync cycles, 0 = off
+        self.snapshot = snapshot
+
+        self.last_cycle_time: typing.Union[float, None] = None
+        self.last_deltas: typing.Dict[str, FleetDelta] = {}
+
+    async def run(self):
+        while True:
+            if self.cfu.is_fresh() and self.cen_dec.is_fresh():
+                # Loaded by a scan or restored meanwhile, save the API calls
+                print(_('Fleet sync skipped, device lists are fresh'))
+            else:
+                await self.sync_once()
+            await asyncio.sleep(self.interval)
+
+    async def sync_once(self):
+        """
+        Run one sync cycle and report its duration and delta counts.
+        """
+        start = time.monotonic()
+        with background_priority():
+            # Scan lookups go first when the rate limit is reached
+            fleet, inventory = await asyncio.gather(
+                self.cfu.refresh_all(),
+                self.cen_dec.refresh_devices(comm_handler=None),
+                return_exceptions=True)
+        self.last_cycle_time = time.monotonic() - start
+
+        deltas = {}
+        for name, result in [('fleet', fleet), ('inventory', inventory)]:
+            if isinstance(result, BaseException):
+                print(
+                    _('Fleet sync of {name} failed: {error!r}').format(
+                        name=name, error=result))
+            else:
+                deltas.update(result)
+        self.last_deltas = deltas
+
+        print(
+            _('Fleet sync finished in {duration:.1f}s: {summary}').format(
+                duration=self.last_cycle_time,
+                summary=', '.join(f'{name} {delta.summary()}'
+                                  for name, delta in deltas.items())))
+        print(
+            _('Fleet by device type: {counts}').format(
+                counts=self.cfu.index.counts_by_family()))
+
+        if self.snapshot and deltas:
+            # Refresh times are always updated, lists only if they changed
+            # since the last save, by this sync or by single device lookups
+            await self.save_snapshot(
+                changed=[*self.cfu.dirty_caches, *self.cen_dec.dirty_caches])
+
+    async def restore_snapshot(self):
+        """
+        Fill the caches from the snapshot file, if there is one.
+        """
+        if not self.snapshot:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            loaded = await loop.run_in_executor(None, self.snapshot.load)
+        except Exception as e:
+            print(_('Could not load snapshot: {error!r}').format(error=e))
+            return
+        if loaded is None:
+            return
+
+        caches, refreshed_at = loaded
+        self.cfu.restore(caches, refreshed_at)
+        self.cen_dec.restore(caches, refreshed_at)
+        loaded_at = [value for value in refreshed_at.values() if value]
+        print(
+            _('Restored {count} devices from snapshot loaded {age:.0f}s ago').
+            format(count=sum(len(devices) for devices in caches.values()),
+                   age=time.time() - min(loaded_at) if loaded_at else 0))
+
+    async def save_snapshot(self,
+                            changed: typing.Union[typing.List[str],
+                                                  None] = None):
+        """
+        Write the current caches to the snapshot file off the event loop.
+        Only the caches named in `changed` are rewritten, all if it is None.
+        """
+        if not self.snapshot:
+            return
+        modules = (self.cfu, self.cen_dec)
+        # Clear first, changes made while the file is written stay dirty
+        for module in modules:
+            module.dirty_caches.difference_update(
+                module.caches() if changed is None else changed)
+        # Shallow copies, so the caches may change while the file is written
+        caches = {
+            name: dict(devices)
+            for name, devices in {
+                **self.cfu.caches(),
+                **self.cen_dec.caches()
+            }.items() if changed is None or name in changed
+        }
+        refreshed_at = {
+            **self.cfu.refresh_times(),
+            **self.cen_dec.refresh_times()
+        }
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.snapshot.save, caches,
+                                       refreshed_at, changed)
+        except Exception as e:
+            print(_('Could not save snapshot: {error!r}').format(error=e))
+            for module in modules:
+                module.dirty_caches.update(name for name in caches
+                                           if name in module.caches())
+
+    async def cleanup_ctx(self, app):
+        """
+        aiohttp cleanup context running the sync for the lifetime of `app`.
+        """
+        await self.restore_snapshot()
+
+        task = None
+        if self.interval > 0:
+            task = asyncio.create_task(self.run())
+        yield
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.save_snapshot()
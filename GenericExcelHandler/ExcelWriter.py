@@ -0,0 +1,130 @@
+import asyncio
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from Metrics.Metrics import registry
+
+queue_length = registry.gauge('excel_writer_queue_length',
+                              'Excel jobs waiting for the writer thread')
+
+Job = typing.Tuple[typing.Callable[..., typing.Any], typing.Tuple,
+                   typing.Union[asyncio.Future, None]]
+
+
+class ExcelWriter():
+    """
+    Runs all excel work on one dedicated thread.
+
+    Jobs are executed in the order they are submitted, so a save always
+    contains every row submitted before it. The queue is bounded: when the
+    writer falls behind, `submit` waits for a free slot instead of buffering
+    without limit.
+    """
+
+    def __init__(self, max_queue: int = 1000) -> None:
+        self.max_queue = max_queue
+        self.executor: typing.Union[ThreadPoolExecutor, None] = None
+        self.queue: typing.Union[asyncio.Queue, None] = None
+        self.worker: typing.Union[asyncio.Task, None] = None
+
+    def start(self):
+        """
+        Start the writer on the running event loop if it is not running yet
+        """
+        if self.worker and not self.worker.done():
+            return
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=1,
+                                               thread_name_prefix='excel')
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.worker = asyncio.create_task(self.work())
+
+    async def work(self):
+        assert self.queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            # Jobs queued meanwhile are run in one go on the thread
+            jobs = [await self.queue.get()]
+            while not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+            queue_length.set(self.queue.qsize())
+            try:
+                results = await loop.run_in_executor(self.executor,
+                                                     self.run_jobs, jobs)
+                for (_func, _args, future), (result, error) in zip(
+                        jobs, results):
+                    if future and not future.done():
+                        if error:
+                            future.set_exception(error)
+                        else:
+                            future.set_result(result)
+            finally:
+                for _job in jobs:
+                    self.queue.task_done()
+
+    @staticmethod
+    def run_jobs(
+        jobs: typing.List[Job]
+    ) -> typing.List[typing.Tuple[typing.Any,
+                                  typing.Union[Exception, None]]]:
+        results = []
+        for func, args, _future in jobs:
+            try:
+                results.append((func(*args), None))
+            except Exception as e:
+                print(f'Excel writer: {func.__qualname__} failed: {e!r}')
+                results.append((None, e))
+        return results
+
+    async def submit(self, func: typing.Callable[..., typing.Any], *args):
+        """
+        Queue `func(*args)` without waiting for it to run
+        """
+        self.start()
+        assert self.queue is not None
+        await self.queue.put((func, args, None))
+        queue_length.set(self.queue.qsize())
+
+    async def run(self, func: typing.Callable[..., typing.Any], *args):
+        """
+        Queue `func(*args)` and wait for its result
+        """
+        self.start()
+        assert self.queue is not None
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((func, args, future))
+        queue_length.set(self.queue.qsize())
+        return await future
+
+    async def wait(self):
+        """
+        Wait until all jobs queued so far have run
+        """
+        await self.run(lambda: None)
+
+    async def close(self):
+        """
+        Wait for all queued jobs and stop the writer thread
+        """
+        if self.queue:
+            await self.queue.join()
+        if self.worker:
+            self.worker.cancel()
+            self.worker = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def run_pending(self):
+        """
+        Run the queued jobs on the calling thread. For the exit of the tool,
+        after the event loop has stopped.
+        """
+        jobs = []
+        while self.queue and not self.queue.empty():
+            jobs.append(self.queue.get_nowait())
+        self.run_jobs(jobs)
+
+
+# Writer shared by all excel logs of the tool
+excel_writer = ExcelWriter()
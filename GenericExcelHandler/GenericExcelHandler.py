@@ -1,54 +1,116 @@
+import asyncio
+import atexit
 import os
 import os.path
 import typing
 from abc import ABC, abstractmethod
 from datetime import datetime
+from uuid import uuid4
 
-from openpyxl import Workbook, load_workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from aiohttp import web
+from GenericExcelHandler.ExcelWriter import excel_writer
+from GenericExcelHandler.LogWriters import LOG_WRITERS, format_of
+from Journal.ScanJournal import ScanJournal
+from Metrics.Metrics import registry
+
+save_duration = registry.histogram(
+    'excel_save_duration_seconds',
+    'Seconds to write an excel log to disk by log name', ('name', ))
 
 
 class GenericExcelHandler(ABC):
+    """
+    Log of a session as excel, CSV or JSON Lines file (`log_format`).
 
-    def __init__(self, filename, uuid=None) -> None:
-        if not self.name:
-            self.name = ''
-        if os.path.exists(filename):
-            if os.path.isdir(filename):
-                filename = os.path.join(filename, self.filename_gen())
-            if os.path.isfile(filename):
-                self.workbook = load_workbook(filename=filename)
-                self.worksheet = typing.cast(
-                    Worksheet,
-                    self.workbook.create_sheet(self.sheetname_gen(),
-                                               index=0))  # type: ignore
-                self.workbook.save(filename)
-            else:
-                self.workbook = Workbook(write_only=False)
-                self.worksheet = self.workbook.active
-                self.worksheet.title = self.sheetname_gen()
-        else:
-            self.workbook = Workbook(write_only=False)
-            self.worksheet = self.workbook.active
-            self.worksheet.title = self.sheetname_gen()
+    The state of every scanned device is kept in `device_states`, the
+    workbook is generated from it on save. Both only happen on the thread of
+    the `excel_writer`, the event loop just queues the changes. Writing the
+    file to disk is deferred by `save_delay` seconds, so several scans share
+    one save. The file is complete after `flush`, `close` or before it is
+    downloaded.
+
+    Without a file name (`filename=None`) no file is written, the changes
+    are only recorded in the journal.
+    """
+
+    # Name of the module, part of generated file names
+    name = ''
+
+    # Header row of the worksheet
+    columns: typing.List[str] = []
+
+    # State of a device before its first update
+    empty_state: typing.Dict[str, typing.Any] = {}
+
+    # Format of new logs, one of `LOG_WRITERS`. None uses the extension of
+    # the log file name or excel
+    log_format: typing.Union[str, None] = None
+
+    # Seconds a changed workbook may stay unsaved. 0 saves on every change
+    save_delay: float = 10
+
+    # Open handlers by file name, used to flush a file before its download
+    open_handlers: typing.Dict[str, 'GenericExcelHandler'] = {}
 
-        # self.worksheet = self.workbook.active
-        # self.worksheet.title = ExcelHandler.sheetname_gen()
+    def __init__(self,
+                 filename,
+                 uuid=None,
+                 journal: typing.Union[ScanJournal, None] = None) -> None:
+        if filename is None:
+            self.format = None
+        elif os.path.isdir(filename):
+            self.format = self.log_format or 'xlsx'
+            # One file per session
+            filename = os.path.join(filename, self.filename_gen())
+        else:
+            self.format = self.log_format or format_of(filename)
+            base, ext = os.path.splitext(filename)
+            filename = f'{base}.{self.format}'
+            if os.path.exists(filename):
+                # Keep the existing log and write this session next to it
+                filename = f'{base}_{self.sheetname_gen()}.{self.format}'
 
-        self.filename = filename
-        self.workbook.save(self.filename)
+        self.filename = filename and self.unique_filename(filename)
+        self.sheetname = self.sheetname_gen()
 
-        if not self.empty_state:
-            self.empty_state = {}
+        # Every change is recorded in the journal under this session
+        self.journal = journal
+        self.session = str(uuid or uuid4())
+        self.session_started = False
 
         self.last_row = 2
-        self.init_worksheet()
 
         self.device_states = {
         }  # f.e. {'SN01': {'state': 'Updated', 'excel_row': 1}}
 
+        self.dirty = False  # Rows changed since the last save
+        self.save_handle: typing.Union[asyncio.TimerHandle, None] = None
+        self.pending_saves: typing.Set[asyncio.Task] = set()
+        self.saving: typing.Union[asyncio.Future, None] = None  # Last save
+
+        if self.filename:
+            # Create the file right away, it may be downloaded before any scan
+            self.schedule_save()
+
+            GenericExcelHandler.open_handlers[self.get_filename()] = self
+
     def filename_gen(self):
-        return datetime.now().strftime(f"%Y-%m-%d_%Hh%Mm%Ss_{self.name}.xlsx")
+        return datetime.now().strftime(
+            f"%Y-%m-%d_%Hh%Mm%Ss_{self.name}.{self.format}")
+
+    @staticmethod
+    def unique_filename(filename: str) -> str:
+        """
+        `filename` or, if it is taken by a file or an open log (f.e. sessions
+        started within the same second), `filename` with a counter
+        """
+        base, ext = os.path.splitext(filename)
+        counter = 1
+        while os.path.exists(filename) or os.path.basename(
+                filename) in GenericExcelHandler.open_handlers:
+            counter += 1
+            filename = f'{base}_{counter}{ext}'
+        return filename
 
     def sheetname_gen(self):
         return datetime.now().strftime("%Y-%m-%d_%Hh%Mm%Ss")
@@ -73,20 +135,183 @@ class GenericExcelHandler(ABC):
 
         return excel_row, device_state
 
+    @staticmethod
     @abstractmethod
-    def init_worksheet(self):
-        pass
+    def row_values(serial, state: dict) -> typing.List[typing.Any]:
+        """
+        Values of the row of `serial` in the order of `columns`
+        """
+
+    def rows(self) -> typing.Iterator[typing.List[typing.Any]]:
+        yield list(self.columns)
+        for serial, state in sorted(self.device_states.items(),
+                                    key=lambda item: item[1]['excel_row']):
+            yield self.row_values(serial, state)
+
+    async def update_state(self, serial, state: dict):
+        """
+        Queue the new state of `serial` for the excel writer
+        """
+        await excel_writer.submit(self.record_state, serial, state)
+        self.schedule_save()
+
+    def record_state(self, serial, state: dict):
+        if self.journal:
+            if not self.session_started:
+                self.journal.start_session(self.session, self.name,
+                                           self.filename)
+                self.session_started = True
+            self.journal.append(self.session, serial, state)
+        self.update_state_internal(serial, state)
+
+    @classmethod
+    def export(cls, journal: ScanJournal, session: str, filename: str):
+        """
+        Write the log of `session` from the journal to `filename` in the
+        format of its extension (.xlsx, .csv or .jsonl)
+        """
 
-    def close(self):
-        self.workbook.save(filename=self.filename)
-        return self.workbook.close()
+        def rows():
+            yield list(cls.columns)
+            for serial, state in journal.session_states(session).items():
+                yield cls.row_values(serial, {**cls.empty_state, **state})
+
+        info = journal.session(session)
+        started_at = datetime.fromtimestamp(info[2]) if info else datetime.now()
+        LOG_WRITERS[format_of(filename)](
+            filename, started_at.strftime("%Y-%m-%d_%Hh%Mm%Ss"), rows())
+
+    async def close(self):
+        await self.flush()
+        GenericExcelHandler.open_handlers.pop(self.get_filename(), None)
 
     def get_filename(self):
-        return os.path.basename(self.filename)
+        return self.filename and os.path.basename(self.filename)
 
-    def delete(self):
-        self.close()
-        return os.remove(self.filename)
+    async def delete(self):
+        await self.close()
+        if self.filename:
+            return await excel_writer.run(os.remove, self.filename)
 
     def save(self):
-        return self.workbook.save(self.filename)
+        """
+        Write all rows of the session to `filename`.
+
+        The file is streamed from `device_states` in the log format, so no
+        previous file is read.
+        """
+        with save_duration.time(name=self.name):
+            LOG_WRITERS[self.format](self.filename, self.sheetname,
+                                     self.rows())
+
+    def schedule_save(self):
+        """
+        Mark the workbook as changed and save it within `save_delay` seconds
+        """
+        if not self.filename:
+            return  # Journal only, nothing to save
+        self.dirty = True
+        if self.save_handle:
+            return  # Already scheduled, the change is part of that save
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop, so nobody else is using the workbook
+            self.save()
+            self.dirty = False
+            return
+        self.save_handle = loop.call_later(max(self.save_delay, 0),
+                                           self.start_flush)
+
+    def start_flush(self):
+        task = asyncio.create_task(self.flush())
+        self.pending_saves.add(task)  # Keeps a reference to the running task
+        task.add_done_callback(self.flush_done)
+
+    def flush_done(self, task: asyncio.Task):
+        self.pending_saves.discard(task)
+        if not task.cancelled():
+            task.exception()  # Reported and retried by `save_done`
+
+    async def flush(self):
+        """
+        Save pending changes and wait until they are written, including a
+        save which is already running (f.e. started by the timer)
+        """
+        if self.save_handle:
+            self.save_handle.cancel()
+            self.save_handle = None
+        if self.dirty:
+            self.dirty = False
+            # Saves run in order on the writer, so this one finishes last
+            self.saving = asyncio.ensure_future(excel_writer.run(self.save))
+            self.saving.add_done_callback(self.save_done)
+        if self.saving:
+            # A cancelled download must not cancel the save
+            await asyncio.shield(self.saving)
+        elif not self.filename:
+            # Journal only, wait for the queued appends
+            await excel_writer.wait()
+
+    def save_done(self, saving: asyncio.Future):
+        if self.saving is saving:
+            self.saving = None
+        if saving.cancelled() or saving.exception() is None:
+            return
+        # The rows are not on disk, f.e. the file is locked by excel
+        print(f'Saving {self.filename} failed, retrying: '
+              f'{saving.exception()!r}')
+        self.dirty = True
+        if not self.save_handle:
+            self.save_handle = asyncio.get_running_loop().call_later(
+                max(self.save_delay, 1), self.start_flush)
+
+    @staticmethod
+    async def flush_file(filename: str):
+        """
+        Save pending changes of the open log with the file name `filename`
+        """
+        handler = GenericExcelHandler.open_handlers.get(
+            os.path.basename(filename))
+        if handler:
+            await handler.flush()
+
+    @staticmethod
+    async def flush_all():
+        for handler in list(GenericExcelHandler.open_handlers.values()):
+            await handler.flush()
+
+    @staticmethod
+    def flush_at_exit():
+        """
+        Write queued rows and pending saves after the event loop stopped
+        """
+        excel_writer.run_pending()
+        for handler in list(GenericExcelHandler.open_handlers.values()):
+            if handler.dirty:
+                try:
+                    handler.save()
+                    handler.dirty = False
+                except Exception as e:
+                    print(f'Saving {handler.filename} failed: {e!r}')
+
+
+# Do not lose buffered rows when the tool exits
+atexit.register(GenericExcelHandler.flush_at_exit)
+
+
+def flush_on_download(download_url: str):
+    """
+    Middleware saving pending changes of a log before it is downloaded from
+    `download_url`
+    """
+    prefix = download_url.rstrip('/') + '/'
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path.startswith(prefix):
+            await GenericExcelHandler.flush_file(request.path[len(prefix):])
+        return await handler(request)
+
+    return middleware
@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+import typing
+from datetime import datetime
+
+from openpyxl import Workbook
+
+Rows = typing.Iterable[typing.List[typing.Any]]
+
+
+def replace_file(filename: str, write: typing.Callable[[str], None]):
+    """
+    Write to a temporary file first and replace `filename` with it, so a
+    download never gets a partially written file
+    """
+    temp_filename = filename + '.tmp'
+    try:
+        write(temp_filename)
+        os.replace(temp_filename, filename)
+    except Exception:
+        # Do not leave a broken temporary file next to the logs
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+
+def write_xlsx(filename: str, sheetname: str, rows: Rows):
+    """
+    Stream `rows` into a new workbook in write-only mode
+    """
+
+    def write(temp_filename):
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheetname)
+        for values in rows:
+            worksheet.append(values)
+        workbook.save(temp_filename)
+
+    replace_file(filename, write)
+
+
+def write_csv(filename: str, sheetname: str, rows: Rows):
+
+    def write(temp_filename):
+        with open(temp_filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            for values in rows:
+                writer.writerow([
+                    value.isoformat(' ', 'seconds')
+                    if isinstance(value, datetime) else value
+                    for value in values
+                ])
+
+    replace_file(filename, write)
+
+
+def write_jsonl(filename: str, sheetname: str, rows: Rows):
+    """
+    One JSON object per row keyed by the header (first row)
+    """
+
+    def write(temp_filename):
+        with open(temp_filename, 'w') as f:
+            iterator = iter(rows)
+            header = next(iterator, [])
+            for values in iterator:
+                f.write(
+                    json.dumps(dict(zip(header, values)),
+                               default=lambda value: value.isoformat()
+                               if isinstance(value, datetime) else str(value)))
+                f.write('\n')
+
+    replace_file(filename, write)
+
+
+# Writer per log format, the format is also the file extension
+LOG_WRITERS: typing.Dict[str, typing.Callable[[str, str, Rows], None]] = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'jsonl': write_jsonl
+}
+
+
+def format_of(filename: str) -> str:
+    """
+    Log format of `filename` by its extension, excel if it is unknown
+    """
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    return extension if extension in LOG_WRITERS else 'xlsx'
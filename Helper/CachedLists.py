@@ -0,0 +1,102 @@
+import time
+import typing
+from abc import abstractmethod
+
+from Communication.CommunicationHandler import CommunicationHandler
+from FleetSync.FleetDelta import FleetDelta, apply_delta
+from Helper.SingleFlight import SingleFlight
+
+
+class CachedLists():
+    """
+    Device lists cached from central, shared by the modules.
+
+    The lists are loaded together by `refresh` and are reused for
+    `cache_ttl` seconds. Changes go through `apply_deltas`, which remembers
+    the changed lists for the next snapshot (`dirty_caches`).
+    """
+
+    # Attribute of each cached list by list name, f.e. {'aps': 'ap_dict'}
+    CACHES: typing.Dict[str, str] = {}
+
+    # Key of the full refresh in `single_flight`
+    REFRESH_KEY = 'refresh'
+
+    def __init__(self, cache_ttl: float = 300) -> None:
+        self.cache_ttl = cache_ttl  # Seconds loaded lists are considered fresh
+        self.refreshed_at: typing.Union[float, None] = None  # Last full load
+        self.single_flight = SingleFlight()  # Joins concurrent refreshes
+        # Lists changed since the last snapshot, also by single lookups
+        self.dirty_caches: typing.Set[str] = set()
+
+    @abstractmethod
+    async def refresh(
+            self, *, comm_handler: typing.Union[CommunicationHandler, None]):
+        """
+        Load all lists from central, joining a refresh already in flight
+        under `REFRESH_KEY`
+        """
+
+    async def refresh_if_stale(self,
+                               *,
+                               comm_handler: typing.Union[CommunicationHandler,
+                                                          None] = None):
+        """
+        Refresh the lists unless they are younger than `self.cache_ttl`
+        seconds.
+        """
+        if self.is_fresh() or (
+                self.refreshed_at is not None
+                and self.single_flight.is_in_flight(self.REFRESH_KEY)):
+            # Fresh or already being revalidated in the background
+            if comm_handler:
+                await comm_handler.print_log(_('Using cached device list'))
+            return
+        await self.refresh(comm_handler=comm_handler)
+
+    def is_fresh(self) -> bool:
+        """
+        Returns `true` if the cached lists are younger than `self.cache_ttl`.
+        """
+        return self.refreshed_at is not None and \
+            time.time() - self.refreshed_at < self.cache_ttl
+
+    def caches(self) -> typing.Dict[str, typing.Dict]:
+        """
+        Returns the cached lists by name, f.e. for a snapshot
+        """
+        return {
+            name: getattr(self, attribute)
+            for name, attribute in self.CACHES.items()
+        }
+
+    def refresh_times(self) -> typing.Dict[str, typing.Union[float, None]]:
+        """
+        Time each cached list was loaded from central, f.e. for a snapshot
+        """
+        return {name: self.refreshed_at for name in self.CACHES}
+
+    def restore(self, caches: typing.Dict[str, typing.Dict],
+                refreshed_at: typing.Dict[str, typing.Union[float, None]]):
+        """
+        Restore the cached lists from a snapshot. `refreshed_at` is the time
+        each list was loaded from central. The lists are only as fresh as the
+        oldest of them.
+        """
+        self.apply_deltas({
+            name: FleetDelta(added=caches.get(name, {}), removed=[], changed={})
+            for name in self.CACHES
+        })
+        times = [refreshed_at.get(name) for name in self.CACHES]
+        self.refreshed_at = None if None in times else min(times)  # type: ignore
+        self.dirty_caches.clear()  # Same as in the snapshot
+
+    def apply_deltas(self, deltas: typing.Dict[str, FleetDelta]):
+        """
+        Apply per list deltas to the cached lists
+        """
+        caches = self.caches()
+        for name, delta in deltas.items():
+            apply_delta(caches[name], delta)
+            if not delta.is_empty():
+                self.dirty_caches.add(name)
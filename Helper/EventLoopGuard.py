@@ -0,0 +1,29 @@
+import asyncio
+import warnings
+
+
+class BlockingCallWarning(RuntimeWarning):
+    pass
+
+
+def is_event_loop_thread() -> bool:
+    """
+    Returns `true` if the calling thread is currently running an event loop
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def warn_if_blocking(description: str):
+    """
+    Warn if a blocking call is made from the event loop thread, where it would
+    stall every other coroutine (f.e. all websocket sessions).
+    """
+    if is_event_loop_thread():
+        warnings.warn(
+            f'Blocking call on the event loop thread: {description}',
+            BlockingCallWarning,
+            stacklevel=3)
@@ -0,0 +1,48 @@
+import asyncio
+import typing
+
+FetchPage = typing.Callable[[int, int], typing.Awaitable[typing.Dict]]
+
+
+async def fetch_all_pages(fetch_page: FetchPage,
+                          items_key: str,
+                          step: int = 1000,
+                          max_in_flight: int = 4) -> typing.List[typing.Dict]:
+    """
+    Pagination aware loading of every item of a Central listing.
+
+    `fetch_page(limit, offset)` has to return the Central response for one
+    page. The first page is requested alone to learn the `total`, all
+    remaining offsets are then requested concurrently with at most
+    `max_in_flight` requests outstanding. Items are returned in offset order.
+
+    If the endpoint does not report a `total` the pages are walked one after
+    another until a short page is returned.
+    """
+    first_page = await fetch_page(step, 0)
+    items = list(first_page[items_key])
+
+    total = first_page.get('total')
+    if total is None:
+        # No total available -> walk until the last (short) page
+        offset = step
+        page = first_page
+        while len(page[items_key]) >= step:
+            page = await fetch_page(step, offset)
+            items.extend(page[items_key])
+            offset = offset + step
+        return items
+
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def fetch_limited(offset: int) -> typing.List[typing.Dict]:
+        async with semaphore:
+            return (await fetch_page(step, offset))[items_key]
+
+    pages = await asyncio.gather(
+        *[fetch_limited(offset) for offset in range(step, total, step)])
+
+    for page in pages:
+        items.extend(page)
+
+    return items
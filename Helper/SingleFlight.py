@@ -0,0 +1,34 @@
+import asyncio
+import typing
+
+T = typing.TypeVar('T')
+
+
+class SingleFlight():
+    """
+    Runs at most one call per key at a time.
+
+    Callers arriving while a call for the same key is in flight join it and
+    receive the same result (or exception). A caller being cancelled does not
+    cancel the shared call for the others.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight: typing.Dict[typing.Hashable, asyncio.Future] = {}
+
+    async def do(self, key: typing.Hashable,
+                 func: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self.in_flight[key] = future
+            future.add_done_callback(
+                lambda done: self.forget(key, done))  # type: ignore
+        return await asyncio.shield(future)
+
+    def forget(self, key: typing.Hashable, future: asyncio.Future):
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+    def is_in_flight(self, key: typing.Hashable) -> bool:
+        return key in self.in_flight
@@ -0,0 +1,72 @@
+import argparse
+import os.path
+import typing
+from datetime import datetime
+
+from Decomission.DecomissionExcelHandler import DecomissionExcelHandler
+from Firmware.FirmwareExcelHandler import FirmwareExcelHandler
+from GenericExcelHandler.GenericExcelHandler import GenericExcelHandler
+from Journal.ScanJournal import ScanJournal, start_of_day
+
+# Log layout per module name stored with the session
+HANDLERS: typing.Dict[str, typing.Type[GenericExcelHandler]] = {
+    handler.name: handler
+    for handler in (FirmwareExcelHandler, DecomissionExcelHandler)
+}
+
+
+def export_session(journal: ScanJournal, session: str, filename: str):
+    """
+    Write the log of `session` to `filename` (.xlsx, .csv or .jsonl)
+    """
+    info = journal.session(session)
+    if not info:
+        raise KeyError(f'Unknown session {session}')
+    HANDLERS[info[0]].export(journal, session, filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Query the scan journal and export session logs from it')
+    parser.add_argument('--journal-file', default='scan_journal.sqlite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sessions = commands.add_parser('sessions', help='List sessions')
+    sessions.add_argument('--today', action='store_true')
+
+    export = commands.add_parser(
+        'export',
+        help='Write the log of a session to an .xlsx, .csv or .jsonl file')
+    export.add_argument('session')
+    export.add_argument('filename')
+
+    today = commands.add_parser(
+        'today',
+        help='Devices which got a date for a state today, '
+        'f.e. "today deleted_on" for all devices decommissioned today')
+    today.add_argument('key')
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.journal_file):
+        parser.error(f'{args.journal_file} does not exist')
+    journal = ScanJournal(args.journal_file)
+    try:
+        if args.command == 'sessions':
+            for session, module, filename, started_at in journal.sessions(
+                    start_of_day() if args.today else None):
+                print(datetime.fromtimestamp(started_at).isoformat(' ',
+                                                                   'seconds'),
+                      module, session, filename or '')
+        elif args.command == 'export':
+            export_session(journal, args.session, args.filename)
+            print(f'Exported {args.session} to {args.filename}')
+        elif args.command == 'today':
+            for serial, at in journal.serials_since(args.key, start_of_day()):
+                print(serial, at.isoformat(' ', 'seconds'))
+    finally:
+        journal.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import time
+import typing
+from datetime import datetime
+
+States = typing.Dict[str, typing.Dict[str, typing.Any]]
+
+
+class ScanJournal():
+    """
+    Append-only log of every scan outcome stored in a local SQLite file.
+
+    Each change of a device state is one row (f.e. `status`, `deleted_on`).
+    Dates are stored as timestamps, everything else as text. The excel logs
+    are a view of a session in this journal and can be exported again at any
+    time, f.e. after a crash.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.lock = threading.Lock()
+        # Appends come from the excel writer thread, exports from any thread
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        # Appends only need to reach the log, not the database file
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'session TEXT PRIMARY KEY, module TEXT, filename TEXT, '
+                'started_at REAL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY, session TEXT, serial TEXT, '
+                'key TEXT, value, at REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS '
+                                    'events_serial ON events (serial)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS '
+                                    'events_session ON events (session)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS '
+                                    'events_key_at ON events (key, at)')
+
+    def start_session(self, session: str, module: str,
+                      filename: typing.Union[str, None]):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)',
+                (session, module, filename, time.time()))
+
+    def append(self,
+               session: str,
+               serial: str,
+               state: typing.Dict[str, typing.Any],
+               at: typing.Union[float, None] = None):
+        """
+        Record the changed `state` of `serial`
+        """
+        if at is None:
+            at = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO events (session, serial, key, value, at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((session, serial, key, to_value(value), at)
+                 for key, value in state.items()))
+
+    def sessions(
+        self,
+        since: typing.Union[float, None] = None
+    ) -> typing.List[typing.Tuple[str, str, str, float]]:
+        """
+        Sessions as (session, module, filename, started_at), oldest first
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT session, module, filename, started_at FROM sessions '
+                'WHERE started_at >= ? ORDER BY started_at',
+                (since or 0, )).fetchall()
+
+    def session(
+        self, session: str
+    ) -> typing.Union[typing.Tuple[str, str, float], None]:
+        """
+        (module, filename, started_at) of `session` or None if it is unknown
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT module, filename, started_at FROM sessions '
+                'WHERE session = ?', (session, )).fetchone()
+
+    def session_states(self, session: str) -> States:
+        """
+        Latest state per device of `session` in the order of the first scan
+        """
+        states: States = {}
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT serial, key, value FROM events WHERE session = ? '
+                'ORDER BY id', (session, )).fetchall()
+        for serial, key, value in rows:
+            states.setdefault(serial, {})[key] = from_value(value)
+        return states
+
+    def serials_since(self, key: str,
+                      since: float) -> typing.List[typing.Tuple[str, datetime]]:
+        """
+        Devices which got a date for `key` since `since`, f.e. all devices
+        deleted today with `serials_since('deleted_on', midnight)`
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT serial, value FROM events WHERE key = ? AND at >= ? '
+                "AND typeof(value) = 'real' ORDER BY at",
+                (key, since)).fetchall()
+        return [(serial, datetime.fromtimestamp(value))
+                for serial, value in rows]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def to_value(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return str(value)
+
+
+def from_value(value):
+    if isinstance(value, float):
+        return datetime.fromtimestamp(value)
+    return value
+
+
+def start_of_day() -> float:
+    return datetime.now().replace(hour=0, minute=0, second=0,
+                                  microsecond=0).timestamp()
@@ -0,0 +1,245 @@
+import bisect
+import contextlib
+import functools
+import time
+import typing
+
+from aiohttp import web
+
+# Seconds. Covers cached scans (sub millisecond) up to slow Central calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10, 30, 60)
+
+Labels = typing.Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names: typing.Sequence[str], values: typing.Sequence[str],
+                  extra: str = '') -> str:
+    pairs = [
+        f'{name}="{escape_label(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric():
+    """
+    Base of all metrics. Values are kept per combination of label values.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, help: str,
+                 labelnames: typing.Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def label_values(self, labels: typing.Dict[str, typing.Any]) -> Labels:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> typing.List[str]:
+        return [
+            f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}'
+        ] + self.samples()
+
+    def samples(self) -> typing.List[str]:
+        return []
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str,
+                 labelnames: typing.Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.values: typing.Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.label_values(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> typing.List[str]:
+        return [
+            f'{self.name}{format_labels(self.labelnames, key)} {format_value(value)}'
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        self.values[self.label_values(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self,
+                 name: str,
+                 help: str,
+                 labelnames: typing.Sequence[str] = (),
+                 buckets: typing.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (+Inf last), sum
+        self.values: typing.Dict[Labels, typing.Tuple[typing.List[int],
+                                                      typing.List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.label_values(labels)
+        if key not in self.values:
+            self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Observe the seconds spent in the `with` block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> typing.List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, key,
+                                       f'le="{format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {format_value(total[0])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry():
+    """
+    Collection of metrics rendered in the Prometheus text format.
+
+    Metrics are created on first use. Asking again for the same name returns
+    the existing metric, so modules can declare the metrics they need.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: typing.Dict[str, Metric] = {}
+
+    def get_or_create(self, cls: typing.Type[Metric], name: str, *args,
+                      **kwargs) -> typing.Any:
+        if name not in self.metrics:
+            self.metrics[name] = cls(name, *args, **kwargs)
+        metric = self.metrics[name]
+        if type(metric) is not cls:
+            raise ValueError(f'Metric {name} is a {metric.type}')
+        return metric
+
+    def counter(self,
+                name: str,
+                help: str,
+                labelnames: typing.Sequence[str] = ()) -> Counter:
+        return self.get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self,
+              name: str,
+              help: str,
+              labelnames: typing.Sequence[str] = ()) -> Gauge:
+        return self.get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self,
+                  name: str,
+                  help: str,
+                  labelnames: typing.Sequence[str] = (),
+                  buckets: typing.Sequence[float] = DEFAULT_BUCKETS
+                  ) -> Histogram:
+        return self.get_or_create(Histogram, name, help, labelnames,
+                                  buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    async def metrics_handler(self, request):
+        return web.Response(
+            body=self.render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+# Registry of the tool, served on `/metrics`
+registry = MetricsRegistry()
+
+cache_refresh_duration = registry.histogram(
+    'cache_refresh_duration_seconds',
+    'Seconds per full load of a device cache from central', ('cache', ))
+cache_refresh_failures = registry.counter(
+    'cache_refresh_failures_total', 'Failed full loads of a device cache',
+    ('cache', ))
+cache_devices = registry.gauge('cache_devices',
+                               'Devices currently held by a device cache',
+                               ('cache', ))
+scan_duration = registry.histogram(
+    'scan_duration_seconds',
+    'Seconds to handle a scanned serial by module and outcome (final status)',
+    ('module', 'outcome'))
+
+
+@contextlib.contextmanager
+def timed_refresh(cache: str):
+    """
+    Observe the duration of a full cache load and count it if it fails
+    """
+    try:
+        with cache_refresh_duration.time(cache=cache):
+            yield
+    except Exception:
+        cache_refresh_failures.inc(cache=cache)
+        raise
+
+
+def timed_scan(module: str):
+    """
+    Decorator for `handle_input` of the module handlers. Observes the
+    duration labelled with the final status printed to `self.comm_handler`.
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            self.comm_handler.last_status = None
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = await func(self, *args, **kwargs)
+                outcome = self.comm_handler.last_status or 'none'
+                return result
+            finally:
+                scan_duration.observe(time.perf_counter() - start,
+                                      module=module,
+                                      outcome=outcome)
+
+        return wrapper
+
+    return decorator
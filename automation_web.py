@@ -10,8 +10,7 @@ import typing
 from aiohttp import web
 
 from CentralAPI.APIKeySetupAndCheck import APIKeySetupAndCheck
-from CentralAPI.CentralAPI import Central
-from CentralTokenAuth.CentralTokenAuth import CentralTokenAuth
+from CentralAPI.CentralStack import CentralStack
 from Communication.CommunicationHandler import CommunicationHandler
 from Decomission.CentralDecomission import CentralDecomission
 from Decomission.DecomissionExcelHandler import DecomissionExcelHandler
@@ -23,10 +22,31 @@ from Firmware.FirmwareExcelHandler import FirmwareExcelHandler
 from Firmware.FirmwareUpgradeHandler import FirmwareUpgradeHandler
 from Firmware.FirmwareUpgradeHandler import redir_handler as fw_redir_handler
 from Firmware.FirmwareWSHandler import FirmwareWSHandler
+from FleetSync.FleetSnapshot import FleetSnapshot
+from FleetSync.FleetSync import FleetSync
+from GenericExcelHandler.ExcelWriter import excel_writer
+from GenericExcelHandler.GenericExcelHandler import (GenericExcelHandler,
+                                                     flush_on_download)
+from GenericExcelHandler.LogWriters import LOG_WRITERS
+from Journal.ScanJournal import ScanJournal
+from Metrics.Metrics import registry as metrics_registry
 
 args = None
 
 
+class StatusRoot():
+
+    def __init__(self, providers: typing.Dict[str,
+                                              typing.Callable[[], typing.Any]]
+                 ) -> None:
+        self.providers = providers
+
+    async def status_handler(self, request):
+        return web.json_response(
+            {name: provider()
+             for name, provider in self.providers.items()})
+
+
 class WebRoot():
 
     def __init__(self, routes: typing.List[typing.Dict]) -> None:
@@ -102,6 +122,10 @@ def main():
     parser.add_argument('--excel-file',
                         default='log.xlsx',
                         help=_('Excel log file'))
+    parser.add_argument(
+        '--log-format',
+        choices=list(LOG_WRITERS),
+        help=_('Format of the log files. Defaults to the extension of --excel-file or xlsx'))
     parser.add_argument(
         '--excel-dir',
         default='./out',
@@ -116,9 +140,86 @@ def main():
         help=
         _('Instead of deleteing the excel file after a session completes keep it'
           ))
+    parser.add_argument(
+        '--excel-save-interval',
+        type=float,
+        default=10,
+        help=_('Seconds new rows may stay unsaved before the excel file is written. 0 saves after every scan'))
+    parser.add_argument(
+        '--journal-file',
+        default='scan_journal.sqlite',
+        help=_('SQLite file every logged scan is appended to'))
+    parser.add_argument('--no-journal',
+                        action='store_false',
+                        dest='journal',
+                        help=_('Disable the scan journal'))
+    parser.add_argument(
+        '--max-in-flight-pages',
+        type=int,
+        default=4,
+        help=_('Maximum number of concurrent page requests while loading device lists'))
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=300,
+        help=_('Seconds a loaded device list is reused for new sessions'))
+    parser.add_argument(
+        '--sync-interval',
+        type=float,
+        default=1800,
+        help=_('Seconds between background syncs of the device lists in web mode. '
+               'Every sync lists all gateways, switches, APs and the inventory: '
+               '4 API calls plus one per further 1000 devices of a list, f.e. '
+               '48 syncs and 200-400 calls per day at 1800 seconds. '
+               'A sync is skipped while the lists are younger than --cache-ttl. '
+               '0 disables the sync'))
+    parser.add_argument(
+        '--snapshot-file',
+        default='device_cache.sqlite',
+        help=_('File the device lists are persisted to for a warm start'))
+    parser.add_argument('--no-snapshot',
+                        action='store_false',
+                        dest='snapshot',
+                        help=_('Disable the device list snapshot'))
+    parser.add_argument(
+        '--max-connections',
+        type=int,
+        default=20,
+        help=_('Maximum number of pooled connections to Central'))
+    parser.add_argument(
+        '--keepalive-expiry',
+        type=float,
+        default=30,
+        help=_('Seconds an idle connection to Central is kept open'))
+    parser.add_argument(
+        '--http2',
+        action='store_true',
+        help=_('Multiplex requests to Central over HTTP/2 (requires h2)'))
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        help=_('Central API calls per second. Defaults to "rate_limit" in the endpoint file or 7'))
+    parser.add_argument(
+        '--daily-quota',
+        type=int,
+        help=_('Central API calls per day. Defaults to "daily_quota" in the endpoint file'))
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=3,
+        help=_('Retries of a failed Central API call. Defaults to 3'))
+    parser.add_argument(
+        '--coalesce-ttl',
+        type=float,
+        default=2,
+        help=_('Seconds identical Central API reads share their result. Defaults to 2'))
     parser.add_argument('--lang', help=_('Language option'))
 
     args = parser.parse_args()
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error(_('--rate-limit must be greater than 0'))
+    if args.daily_quota is not None and args.daily_quota <= 0:
+        parser.error(_('--daily-quota must be greater than 0'))
 
     if 'de' == args.lang:
         translate_de.install()
@@ -144,33 +245,53 @@ def main():
         download_url = args.download_url
 
     excel_persist = args.excel_persist
+    GenericExcelHandler.save_delay = args.excel_save_interval
+    GenericExcelHandler.log_format = args.log_format
+
+    # Durable record of all logged scans, logs can be exported from it again
+    journal = ScanJournal(args.journal_file) if args.journal else None
 
     group = args.group
     target_firmware = args.firmware
 
     open_browser = args.open_browser
 
-    # Extract base_url from endpoint configuration file
+    # Extract base_url and optional tenant limits from endpoint configuration file
     base_url = None
     with open(endpoint_file, 'r') as f:
-        base_url = json.load(f)['base_url']
+        endpoint = json.load(f)
+        base_url = endpoint['base_url']
 
-    # Configure central api client using credential provided via `client_id_file` and `credential_file`
-    central_client = Central(base_url,
-                             backend='httpx',
-                             auth=CentralTokenAuth(
-                                 base_url=base_url,
+    rate_limit = args.rate_limit if args.rate_limit is not None else \
+        endpoint.get('rate_limit', 7)
+    daily_quota = args.daily_quota if args.daily_quota is not None else \
+        endpoint.get('daily_quota')
+
+    # Central client with pooling, rate limiting, retries and coalescing
+    central_stack = CentralStack(base_url=base_url,
                                  client_id_file=client_id_file,
-                                 credential_file=credential_file))
+                                 credential_file=credential_file,
+                                 max_connections=args.max_connections,
+                                 keepalive_expiry=args.keepalive_expiry,
+                                 http2=args.http2,
+                                 rate_limit=rate_limit,
+                                 daily_quota=daily_quota,
+                                 max_retries=args.max_retries,
+                                 coalesce_ttl=args.coalesce_ttl)
+    central_client = central_stack.client
 
     # Local Firmware checking module
-    cfu = CentralFirmwareUpgrade(central_client=central_client,
-                                 group=group,
-                                 target_firmware=target_firmware)
+    cfu = CentralFirmwareUpgrade(
+        central_client=central_client,
+        group=group,
+        target_firmware=target_firmware,
+        max_in_flight_pages=args.max_in_flight_pages,
+        cache_ttl=args.cache_ttl)
 
     # Local Decomissioning module
     cen_dec = CentralDecomission(central_client=central_client,
-                                 device_type='all')
+                                 device_type='all',
+                                 cache_ttl=args.cache_ttl)
 
     # cen_com = CentralComisison(central_client=central_client,
     #                              device_type='all')
@@ -178,7 +299,38 @@ def main():
     # Check if we should provide the web interface
     if args.web:
         print(_('Running in web mode'))
-        app = web.Application()
+        middlewares = []
+        if excel_dir and download_url:
+            # Downloads include rows which are not yet saved
+            middlewares.append(flush_on_download(download_url))
+        app = web.Application(middlewares=middlewares)
+
+        preload_tasks = []  # Keeps a reference to the running task
+
+        async def preload_target_firmware(app):
+            # Not awaited, so the server can start listening right away
+            preload_tasks.append(
+                asyncio.create_task(cfu.preload_target_firmware()))
+
+        app.on_startup.append(preload_target_firmware)
+
+        fleet_sync = FleetSync(
+            cfu=cfu,
+            cen_dec=cen_dec,
+            interval=args.sync_interval,
+            snapshot=FleetSnapshot(args.snapshot_file)
+            if args.snapshot else None)
+        app.cleanup_ctx.append(fleet_sync.cleanup_ctx)
+        app.on_cleanup.append(lambda _: central_stack.close())
+
+        async def flush_excel(app):
+            # Sessions cut off by the shutdown did not save their rows
+            await GenericExcelHandler.flush_all()
+            await excel_writer.close()
+            if journal:
+                journal.close()
+
+        app.on_cleanup.append(flush_excel)
 
         routes = [
             web.static('/app', './web', show_index=True),
@@ -188,7 +340,8 @@ def main():
                     cfu=cfu,
                     excel_dir=excel_dir,
                     download_url=download_url,
-                    excel_persist=excel_persist).websocket_handler),
+                    excel_persist=excel_persist,
+                    journal=journal).websocket_handler),
             web.get('/firmware', fw_redir_handler),
             web.get(
                 '/decomission/ws',
@@ -196,8 +349,20 @@ def main():
                     cen_dec=cen_dec,
                     excel_dir=excel_dir,
                     download_url=download_url,
-                    excel_persist=excel_persist).websocket_handler),
+                    excel_persist=excel_persist,
+                    journal=journal).websocket_handler),
             web.get('/decomission', dec_redir_handler),
+            web.get(
+                '/status',
+                StatusRoot(
+                    providers={
+                        **central_stack.status_providers(),
+                        'fleet': lambda: {
+                            'by_device_type': cfu.index.counts_by_family(),
+                            'by_group': cfu.index.counts_by_group()
+                        }
+                    }).status_handler),
+            web.get('/metrics', metrics_registry.metrics_handler),
             web.get(
                 '/',
                 WebRoot(routes=[{
@@ -231,11 +396,13 @@ def main():
                 local_decomission(
                     cen_dec=cen_dec,
                     excel_file=excel_file,
+                    journal=journal,
                 ))
         elif mode == 'f':
             asyncio.run(local_firmware_check(
                 cfu=cfu,
                 excel_file=excel_file,
+                journal=journal,
             ))
 
         print(_('Operation mode unknown'))
@@ -244,18 +411,20 @@ def main():
 
 
 async def local_firmware_check(cfu: CentralFirmwareUpgrade,
-                               excel_file: typing.Union[str, None] = None):
+                               excel_file: typing.Union[str, None] = None,
+                               journal: typing.Union[ScanJournal, None] = None):
     # For logs to excel
     excel_handler = None
     if excel_file:
         print(f'Excel {excel_file}')
-        excel_handler = FirmwareExcelHandler(excel_file)
+        excel_handler = FirmwareExcelHandler(excel_file, journal=journal)
+    elif journal:
+        # No excel log, only record the scans in the journal
+        excel_handler = FirmwareExcelHandler(None, journal=journal)
 
     comm_handler = CommunicationHandler()
 
-    await cfu.refresh_gateways(comm_handler=comm_handler)
-    await cfu.refresh_switches(comm_handler=comm_handler)
-    await cfu.refresh_aps(comm_handler=comm_handler)
+    await cfu.refresh_all(comm_handler=comm_handler)
 
     client_handler = FirmwareUpgradeHandler(cfu,
                                             comm_handler=comm_handler,
@@ -266,15 +435,22 @@ async def local_firmware_check(cfu: CentralFirmwareUpgrade,
         await comm_handler.print_log(_('Serial Number'))
 
         await client_handler.handle_input(serial=str(input()).strip())
+        if excel_handler:
+            # input() blocks the loop, write the scan before the next one
+            await excel_handler.flush()
 
 
 async def local_decomission(cen_dec: CentralDecomission,
-                            excel_file: typing.Union[str, None] = None):
+                            excel_file: typing.Union[str, None] = None,
+                            journal: typing.Union[ScanJournal, None] = None):
     # For logs to excel
     excel_handler = None
     if excel_file:
         print(f'Excel {excel_file}')
-        excel_handler = DecomissionExcelHandler(excel_file)
+        excel_handler = DecomissionExcelHandler(excel_file, journal=journal)
+    elif journal:
+        # No excel log, only record the scans in the journal
+        excel_handler = DecomissionExcelHandler(None, journal=journal)
 
     comm_handler = CommunicationHandler()
 
@@ -290,6 +466,9 @@ async def local_decomission(cen_dec: CentralDecomission,
 
         await client_handler.handle_input(serial=str(input()).strip(),
                                           options={'unlicense': False})
+        if excel_handler:
+            # input() blocks the loop, write the scan before the next one
+            await excel_handler.flush()
 
 
 if __name__ == '__main__':